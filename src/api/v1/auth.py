@@ -7,7 +7,8 @@ from flask import Blueprint, Response, jsonify
 from flask_jwt_extended import jwt_required
 
 from core import limiter
-from schemas import SignInSchema, SignUpSchema, UpdatePasswordSchema
+from schemas import (LoginHistoryExportSchema, LoginHistoryQuerySchema,
+                     SignInSchema, SignUpSchema, UpdatePasswordSchema)
 from services import AuthService
 from utils import RequestValidator
 
@@ -149,16 +150,37 @@ def logout_all(auth_service: AuthService) -> Response:
 
 @auth_bp.route("/login_history", methods=["GET"])
 @jwt_required()
-def login_history(auth_service: AuthService) -> Response:
+@RequestValidator.validate_query_args(schema=LoginHistoryQuerySchema)
+def login_history(args, auth_service: AuthService) -> Response:
     """Запрос истории посещений
+    Записи отдаются страницами от новых к старым. Если есть следующая страница,
+    то её курсор возвращается в заголовке X-Next-Cursor, его нужно передать в параметре after
     ---
     get:
       description: Получение информации об истории посещений
       security:
         - jwt_token: []
+      parameters:
+      - name: after
+        in: query
+        description: курсор страницы "<date>,<id>" из заголовка X-Next-Cursor предыдущего ответа
+        required: false
+        schema:
+          type: string
+      - name: limit
+        in: query
+        description: количество записей на странице, от 1 до 1000, по умолчанию 100
+        required: false
+        schema:
+          type: integer
       responses:
         200:
           description: История посещений успешно получены
+          headers:
+            X-Next-Cursor:
+              description: курсор следующей страницы, если она есть
+              schema:
+                type: string
         400:
           description: Некорректный запрос
         401:
@@ -166,7 +188,41 @@ def login_history(auth_service: AuthService) -> Response:
       tags:
         - Аккаунты пользователей
     """
-    return auth_service.login_history()
+    return auth_service.login_history(args)
+
+
+@auth_bp.route("/login_history/export", methods=["GET"])
+@jwt_required()
+@RequestValidator.validate_query_args(schema=LoginHistoryExportSchema)
+def export_login_history(args, auth_service: AuthService) -> Response:
+    """Выгрузка всей истории посещений файлом
+    Ответ отдаётся потоком по мере чтения из бд, поэтому размер истории не влияет на память воркера
+    ---
+    get:
+      description: Выгрузка всей истории посещений в формате NDJSON(по умолчанию) или CSV
+      security:
+        - jwt_token: []
+      parameters:
+      - name: format
+        in: query
+        description: формат выгрузки, ndjson или csv
+        required: false
+        schema:
+          type: string
+      responses:
+        200:
+          description: История посещений, по записи на строку
+          content:
+            application/x-ndjson: {}
+            text/csv: {}
+        400:
+          description: Некорректный запрос
+        401:
+          description: Необходима авторизация
+      tags:
+        - Аккаунты пользователей
+    """
+    return auth_service.export_login_history(args)
 
 
 @auth_bp.route("/me", methods=["GET"])
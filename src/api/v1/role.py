@@ -197,3 +197,24 @@ def unassign_role(data, role_service: RoleService) -> Response:
         - Роли пользователя
     """
     return role_service.unassign_role(data)
+
+
+@role_bp.route("/dictionary", methods=["GET"])
+@jwt_required()
+def get_role_dictionary(role_service: RoleService) -> Response:
+    """Запрос словаря ролей для раскодирования компактной маски ролей `urm` из access токена.
+    Доступен по access токену: у потребителя маски токен и так есть
+    ---
+    get:
+      description: Текущий словарь ролей, i-ый бит маски ролей соответствует i-ой роли словаря
+      security:
+        - jwt_token: []
+      responses:
+        200:
+          description: Версия словаря и список ролей
+        401:
+          description: Требуется авторизация
+      tags:
+        - Роли пользователя
+    """
+    return role_service.get_role_dictionary()
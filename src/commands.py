@@ -1,9 +1,37 @@
 import getpass
+import importlib.util
+import os
+import typing as t
 
-from flask import Flask
+import click
+from flask import Flask, current_app
 
 from core import db
+from core.password_hasher import PasswordHasher
 from models import Role, User
+from services.login_history_retention import LoginHistoryRetention
+from services.role_cache import role_cache
+from storage import JWTRedisCompactStorage
+
+# варианты параметров хеширования для бенчмарка, внутри алгоритма по возрастанию стоимости
+HASH_BENCHMARK_CANDIDATES = [
+    ("pbkdf2", dict(pbkdf2_iterations=100_000), dict(PASSWORD_PBKDF2_ITERATIONS=100_000)),
+    ("pbkdf2", dict(pbkdf2_iterations=260_000), dict(PASSWORD_PBKDF2_ITERATIONS=260_000)),
+    ("pbkdf2", dict(pbkdf2_iterations=600_000), dict(PASSWORD_PBKDF2_ITERATIONS=600_000)),
+    ("scrypt", dict(scrypt_params=(2 ** 14, 8, 1)), dict(PASSWORD_SCRYPT_N=2 ** 14)),
+    ("scrypt", dict(scrypt_params=(2 ** 15, 8, 1)), dict(PASSWORD_SCRYPT_N=2 ** 15)),
+    ("scrypt", dict(scrypt_params=(2 ** 16, 8, 1)), dict(PASSWORD_SCRYPT_N=2 ** 16)),
+    (
+        "argon2",
+        dict(argon2_params=dict(time_cost=2, memory_cost=19456, parallelism=1)),
+        dict(PASSWORD_ARGON2_TIME_COST=2, PASSWORD_ARGON2_MEMORY_COST=19456, PASSWORD_ARGON2_PARALLELISM=1),
+    ),
+    (
+        "argon2",
+        dict(argon2_params=dict(time_cost=3, memory_cost=65536, parallelism=1)),
+        dict(PASSWORD_ARGON2_TIME_COST=3, PASSWORD_ARGON2_MEMORY_COST=65536, PASSWORD_ARGON2_PARALLELISM=1),
+    ),
+]
 
 
 def init_commands(app: Flask):
@@ -11,9 +39,67 @@ def init_commands(app: Flask):
     def create_admin():
         username = input("username:")
         password = getpass.getpass()
-        role_admin = Role.query.filter_by(name="Admin").first() or Role(name="Admin")
+        role_admin = role_cache.get_role("Admin") or Role(name="Admin")
         user_admin = User(username=username, password=password)
         user_admin.roles.append(role_admin)
         db.session.add(user_admin)
         db.session.commit()
+        role_cache.invalidate()
         print("User Admin successfully created")
+
+    @app.cli.command("migrate_refresh_tokens")
+    def migrate_refresh_tokens():
+        """Переносит refresh токены в redis из обычного формата в компактный(JWT_REDIS_COMPACT=1)"""
+        from di import ServiceInjector
+        storage = ServiceInjector.make_jwt_storage()
+        if not isinstance(storage, JWTRedisCompactStorage):
+            print("Compact token storage is disabled. Set JWT_REDIS_COMPACT=1 and JWT_STORAGE=redis")
+            return
+        migrated = storage.migrate_legacy_tokens()
+        print(f"{migrated} refresh tokens successfully migrated")
+
+    @app.cli.command("hash_benchmark")
+    @click.option("--budget-ms", default=100.0, help="Допустимое время хеширования одного пароля, мс")
+    @click.option("--min-time", default=1.0, help="Время замера одного варианта, секунды")
+    def hash_benchmark(budget_ms: float, min_time: float):
+        """Замеряет скорость хеширования паролей на этой машине и подбирает параметры под бюджет времени"""
+        cores = os.cpu_count() or 1
+        suggestions = {}
+        print(f"{'method':<8}{'params':<88}{'ms/hash':>10}{'hash/s/core':>14}{f'hash/s/{cores} cores':>18}")
+        for method, params, env in HASH_BENCHMARK_CANDIDATES:
+            if method == "argon2" and importlib.util.find_spec("argon2") is None:
+                continue
+            hasher = PasswordHasher()
+            hasher.configure(method, **params)
+            seconds = hasher.measure(min_time=min_time)
+            params_str = " ".join(f"{key}={value}" for key, value in env.items())
+            print(f"{method:<8}{params_str:<88}{seconds * 1000:>10.1f}{1 / seconds:>14.1f}{cores / seconds:>18.1f}")
+            if seconds * 1000 <= budget_ms:
+                # варианты идут по возрастанию стоимости, поэтому остаётся самый стойкий из укладывающихся в бюджет
+                suggestions[method] = dict(PASSWORD_HASH_METHOD=method, **env)
+
+        print(f"\nSuggested settings for {budget_ms:g} ms budget:")
+        for env in suggestions.values():
+            print("  " + " ".join(f"{key}={value}" for key, value in env.items()))
+        if not suggestions:
+            print("  no candidate fits the budget, increase --budget-ms")
+
+    @app.cli.command("login_history_maintain")
+    @click.option("--retention-months", type=int, default=None, help="Срок хранения истории входов, месяцев")
+    @click.option("--premake-months", type=int, default=None, help="На сколько месяцев вперёд создавать секции")
+    def login_history_maintain(retention_months: t.Optional[int], premake_months: t.Optional[int]):
+        """Создаёт будущие секции истории входов и удаляет историю старше срока хранения"""
+        config = current_app.config
+        if retention_months is None:
+            retention_months = config.get("LOGIN_HISTORY_RETENTION_MONTHS", 12)
+        if premake_months is None:
+            premake_months = config.get("LOGIN_HISTORY_PREMAKE_MONTHS", 3)
+        retention = LoginHistoryRetention(
+            retention_months=retention_months,
+            premake_months=premake_months,
+            batch_size=config.get("LOGIN_HISTORY_DELETE_BATCH_SIZE", 10_000),
+        )
+        result = retention.run()
+        print(f"Partitions created: {', '.join(result.created) or '-'}")
+        print(f"Partitions dropped: {', '.join(result.dropped) or '-'}")
+        print(f"Rows deleted: {result.deleted}")
@@ -2,6 +2,9 @@ EXC_SOMETHING_WENT_WRONG = "Something went wrong. Please try again later"
 EXC_WRONG_CREDENTIALS = "Wrong username or password"
 EXC_REFRESH_TOKEN_INVALID = "Refresh token not found or was stolen. Please make sign-in and logout all other devices"
 ERR_CREATE_USER = "Error create user"
+EXC_USERNAME_EXISTS = "Username already exists."
+EXC_EMAIL_EXISTS = "Email is already registered."
+EXC_ROLE_NAME_EXISTS = "Role's name already exists."
 
 USER_NOT_FOUND = "User {user} not found"
 PASSWORD_CHANGED = "Password successfully changed"
@@ -1,23 +1,31 @@
 import typing as t
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask_injector import FlaskInjector
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, jwt_required
+from flask_jwt_extended.config import config as jwt_config
 from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from .config import settings
+from .jwt_keys import JWTKeyRing
+from .password_hasher import PasswordHasher
 from .logger import init_log_config
+from .pubsub import PubSub
+from .redis_pool import get_limiter_storage_options, get_pools_stats
 
 db = SQLAlchemy()
 migrate = Migrate()
 ma = Marshmallow()
 jwt = JWTManager()
+jwt_keys = JWTKeyRing()
 limiter = Limiter(key_func=get_remote_address)
+pubsub = PubSub()
+password_hasher = PasswordHasher()
 
 
 def create_app(test_config: t.Optional[object] = None) -> Flask:
@@ -30,7 +38,22 @@ def create_app(test_config: t.Optional[object] = None) -> Flask:
     else:
         app.config.from_object(test_config)
 
+    password_hasher.init_app(app)  # алгоритм хеширования паролей
     jwt.init_app(app)  # инициализация менеджера для работы с JWT
+    jwt_keys.init_app(app)  # ключи подписи JWT для асимметричных алгоритмов
+
+    @jwt.encode_key_loader
+    def encode_key_loader(identity) -> t.Any:
+        return jwt_keys.signing_key if jwt_keys.enabled else jwt_config.encode_key
+
+    @jwt.decode_key_loader
+    def decode_key_loader(jwt_header: dict, jwt_payload: dict) -> t.Any:
+        """Ключ проверки выбираем по kid из заголовка токена, так после ротации принимаются и старые токены"""
+        return jwt_keys.get_verification_key(jwt_header.get("kid")) if jwt_keys.enabled else jwt_config.decode_key
+
+    @jwt.additional_headers_loader
+    def additional_headers_loader(identity) -> dict:
+        return {"kid": jwt_keys.active_kid} if jwt_keys.enabled else {}
 
     @jwt.user_identity_loader
     def user_identity_loader(user) -> str:
@@ -38,7 +61,21 @@ def create_app(test_config: t.Optional[object] = None) -> Flask:
 
     @jwt.user_lookup_loader
     def user_lookup_loader(jwt_header: dict, jwt_payload: dict):
-        return UserService().get_by_id(jwt_payload["sub"])
+        """current_user собирается из claims токена, модель пользователя загружается из бд только при необходимости.
+        Вызывается один раз за запрос, дальше flask_jwt_extended отдаёт тот же объект
+        """
+        return UserPrincipal(
+            jwt_payload,
+            user_loader=UserService().get_by_id_cached,
+            roles_loader=lambda claims: flask_injector.injector.get(JWTService).get_roles_from_claims(claims),
+        )
+
+    @jwt.token_in_blocklist_loader
+    def token_in_blocklist_loader(jwt_header: dict, jwt_payload: dict) -> bool:
+        """Проверка не был ли access токен отозван, например при logout"""
+        if jwt_payload["type"] != "access":
+            return False
+        return flask_injector.injector.get(JWTStorage).is_access_token_revoked(jwt_payload["jti"])
 
     ma.init_app(app)  # инициализация Marshmallow
     db.init_app(app)  # инициализация БД
@@ -51,9 +88,26 @@ def create_app(test_config: t.Optional[object] = None) -> Flask:
 
     migrate.init_app(app, db, render_as_batch=is_sqlite, compare_type=True)
 
+    from models import UserPrincipal
+    from services import JWTService
     from services.user_service import UserService
     app.user_service = UserService()  # кладем в глобальный объект фласка инстанс UserService
 
+    from services.user_cache import user_cache
+    user_cache.init_pubsub(  # кеш пользователей для current_user, инвалидация через pub/sub
+        pubsub, maxsize=app.config.get("USER_CACHE_SIZE", 10_000), ttl=app.config.get("USER_CACHE_TTL", 60)
+    )
+
+    from services.role_cache import role_cache
+    role_cache.init_pubsub(pubsub, ttl=app.config.get("ROLE_CACHE_TTL", 300))  # кеш ролей, сброс через pub/sub
+
+    from services.login_history_writer import login_history_writer
+    login_history_writer.init_app(app)  # фоновая запись истории входов пачками
+
+    from services.user_agent_cache import user_agent_cache
+    # после init_app записи: буфер предыдущего приложения записан с id его справочника
+    user_agent_cache.init_app(app)
+
     from api.v1 import create_api
     create_api(app)  # регистрируем blueprint для API v1
 
@@ -66,6 +120,12 @@ def create_app(test_config: t.Optional[object] = None) -> Flask:
     from swagger import init_swagger_ui
     init_swagger_ui(app)  # подключаем swagger
 
+    from jwks import init_jwks
+    init_jwks(app)  # публикуем открытые ключи для проверки токенов другими сервисами
+
+    # лимитер работает через общий пул соединений с redis, либо через свой пул с теми же ограничениями
+    limiter_storage_options = get_limiter_storage_options(app.config.get("RATELIMIT_STORAGE_URL"))
+    app.config.setdefault("RATELIMIT_STORAGE_OPTIONS", limiter_storage_options)
     limiter.init_app(app)  # инициализируем limiter
 
     @app.route("/ping")
@@ -73,7 +133,19 @@ def create_app(test_config: t.Optional[object] = None) -> Flask:
         """Роут для проверки запуска flask"""
         return "pong"
 
+    from utils import admin_required
+
+    @app.route("/redis_pools")
+    @jwt_required()
+    @admin_required
+    def redis_pools():
+        """Роут для мониторинга, статистика использования пулов соединений с redis текущего воркера.
+        Отдаёт адреса и загрузку redis, поэтому доступен только admin
+        """
+        return jsonify(get_pools_stats())
+
     from di import ServiceInjector
-    FlaskInjector(app=app, modules=[ServiceInjector])  # внедряем DI
+    from storage import JWTStorage
+    flask_injector = FlaskInjector(app=app, modules=[ServiceInjector])  # внедряем DI
 
     return app
@@ -1,3 +1,5 @@
+import typing as t
+
 from pydantic import BaseSettings, Field
 
 
@@ -12,9 +14,66 @@ class Settings(BaseSettings):
     SQLALCHEMY_ECHO: bool = True
 
     # JWT
-    JWT_REDIS_URL: str = Field("redis://127.0.0.1:6379/3", env="JWT_REDIS_URL", description="Редис для хранения jwt")
+    JWT_STORAGE: t.Literal["redis", "redis_cluster", "memory"] = Field(
+        "redis", env="JWT_STORAGE", description="Хранилище токенов, memory - в памяти процесса, без redis"
+    )
+    JWT_REDIS_URL: str = Field(
+        "redis://127.0.0.1:6379/3", env="JWT_REDIS_URL", description="Редис для хранения jwt, для кластера любой узел"
+    )
+    JWT_REDIS_COMPACT: bool = Field(
+        False, env="JWT_REDIS_COMPACT", description="Компактная бинарная кодировка refresh токенов(JWT_STORAGE=redis)"
+    )
+    JWT_ALGORITHM: str = Field(
+        "HS256", env="JWT_ALGORITHM", description="HS256 - подпись SECRET_KEY, RS256/EdDSA - ключами из JWT_KEYS_DIR"
+    )
+    JWT_KEYS_DIR: t.Optional[str] = Field(None, env="JWT_KEYS_DIR", description="Каталог ключей <kid>.key/<kid>.pub")
+    JWT_ACTIVE_KID: t.Optional[str] = Field(None, env="JWT_ACTIVE_KID", description="kid ключа для подписи")
+    JWT_JWKS_MAX_AGE: int = Field(24 * 60 * 60, env="JWT_JWKS_MAX_AGE")  # сутки, время кеширования jwks потребителями
+    JWT_COMPACT_ROLES: bool = Field(
+        False, env="JWT_COMPACT_ROLES", description="Роли в access токене маской по словарю /roles/dictionary"
+    )
     JWT_REFRESH_TOKEN_EXPIRES: int = Field(30 * 24 * 60 * 60, env="JWT_REFRESH_TOKEN_EXPIRES")  # 30 дней
     JWT_ACCESS_TOKEN_EXPIRES: int = Field(15 * 60, env="JWT_ACCESS_TOKEN_EXPIRES")   # 15 минут
+    # локальный фильтр Блума отозванных access токенов, размер на ожидаемое количество отзывов за время жизни токена
+    JWT_REVOKED_FILTER_CAPACITY: int = Field(100_000, env="JWT_REVOKED_FILTER_CAPACITY")
+    JWT_REVOKED_FILTER_ERROR_RATE: float = Field(0.01, env="JWT_REVOKED_FILTER_ERROR_RATE")
+
+    # хеширование паролей: pbkdf2, scrypt или argon2(нужен пакет argon2-cffi)
+    PASSWORD_HASH_METHOD: t.Literal["pbkdf2", "scrypt", "argon2"] = Field("pbkdf2", env="PASSWORD_HASH_METHOD")
+    PASSWORD_PBKDF2_ITERATIONS: int = Field(260_000, env="PASSWORD_PBKDF2_ITERATIONS")
+    PASSWORD_SCRYPT_N: int = Field(2 ** 15, env="PASSWORD_SCRYPT_N")
+    PASSWORD_SCRYPT_R: int = Field(8, env="PASSWORD_SCRYPT_R")
+    PASSWORD_SCRYPT_P: int = Field(1, env="PASSWORD_SCRYPT_P")
+    PASSWORD_ARGON2_TIME_COST: int = Field(3, env="PASSWORD_ARGON2_TIME_COST")
+    PASSWORD_ARGON2_MEMORY_COST: int = Field(65536, env="PASSWORD_ARGON2_MEMORY_COST")  # KiB
+    PASSWORD_ARGON2_PARALLELISM: int = Field(4, env="PASSWORD_ARGON2_PARALLELISM")
+    PASSWORD_HASH_THREADS: int = Field(4, env="PASSWORD_HASH_THREADS", description="Потоков хеширования под gevent")
+
+    # кеш пользователей для current_user в каждом воркере, 0 - кеш выключен
+    USER_CACHE_TTL: int = Field(60, env="USER_CACHE_TTL")  # секунды
+    USER_CACHE_SIZE: int = Field(10_000, env="USER_CACHE_SIZE")
+    # кеш всех ролей в каждом воркере
+    ROLE_CACHE_TTL: int = Field(300, env="ROLE_CACHE_TTL")  # секунды
+    # история входов пишется в бд пачками в фоне, буфер в каждом воркере
+    LOGIN_HISTORY_BATCH_SIZE: int = Field(500, env="LOGIN_HISTORY_BATCH_SIZE")
+    LOGIN_HISTORY_FLUSH_INTERVAL: float = Field(1.0, env="LOGIN_HISTORY_FLUSH_INTERVAL")  # секунды
+    LOGIN_HISTORY_BUFFER_SIZE: int = Field(10_000, env="LOGIN_HISTORY_BUFFER_SIZE")
+    # попытки записи при ошибках кроме недоступности бд
+    LOGIN_HISTORY_MAX_ATTEMPTS: int = Field(5, env="LOGIN_HISTORY_MAX_ATTEMPTS")
+    USER_AGENT_CACHE_SIZE: int = Field(10_000, env="USER_AGENT_CACHE_SIZE", description="Кеш справочника User-Agent")
+    # срок хранения истории входов для команды login_history_maintain
+    LOGIN_HISTORY_RETENTION_MONTHS: int = Field(12, env="LOGIN_HISTORY_RETENTION_MONTHS")
+    LOGIN_HISTORY_PREMAKE_MONTHS: int = Field(3, env="LOGIN_HISTORY_PREMAKE_MONTHS", description="Секций впрок")
+    LOGIN_HISTORY_DELETE_BATCH_SIZE: int = Field(10_000, env="LOGIN_HISTORY_DELETE_BATCH_SIZE")
+
+    # redis, настройки пула соединений(пул один на воркер и url)
+    REDIS_MAX_CONNECTIONS: int = Field(50, env="REDIS_MAX_CONNECTIONS", description="Соединений в пуле на воркер")
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = Field(2.0, env="REDIS_SOCKET_CONNECT_TIMEOUT")  # секунды
+    REDIS_SOCKET_TIMEOUT: float = Field(2.0, env="REDIS_SOCKET_TIMEOUT")  # секунды
+    REDIS_SOCKET_KEEPALIVE: bool = Field(True, env="REDIS_SOCKET_KEEPALIVE")
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(30, env="REDIS_HEALTH_CHECK_INTERVAL")  # секунды
+    REDIS_POOL_BLOCKING: bool = Field(False, env="REDIS_POOL_BLOCKING", description="Ждать свободное соединение")
+    REDIS_POOL_TIMEOUT: float = Field(1.0, env="REDIS_POOL_TIMEOUT")  # секунды ожидания в блокирующем режиме
 
     # swagger
     SWAGGER_URL: str = Field("/api/docs", env="SWAGGER_URL")
@@ -0,0 +1,97 @@
+"""
+Ключи подписи JWT для асимметричных алгоритмов(RS256, EdDSA и т.д.).
+Токены подписываются закрытым ключом сервиса, а открытые ключи публикуются в `/.well-known/jwks.json`,
+так другие сервисы проверяют токены у себя и не ходят в auth на каждый запрос.
+
+Ключи лежат в каталоге `JWT_KEYS_DIR`, kid ключа это имя файла без расширения:
+  - `<kid>.key` - закрытый ключ в PEM, им можно подписывать
+  - `<kid>.pub` - открытый ключ в PEM, только для проверки(следующий ключ или выведенный из работы)
+Подписывает ключ `JWT_ACTIVE_KID`, если он не задан, то последний по имени закрытый ключ.
+Проверяются и публикуются все ключи каталога.
+
+Ротация: кладём новый ключ `.pub` файлом и ждём `JWT_JWKS_MAX_AGE`, чтобы он попал в кеши потребителей,
+затем делаем его активным(`.key` + `JWT_ACTIVE_KID`). Старый ключ оставляем `.pub` файлом
+пока не истекут подписанные им refresh токены.
+"""
+
+import json
+import typing as t
+from pathlib import Path
+
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from flask import Flask
+from jwt.algorithms import get_default_algorithms
+from jwt.exceptions import InvalidTokenError
+
+PRIVATE_KEY_SUFFIX = ".key"
+PUBLIC_KEY_SUFFIX = ".pub"
+
+
+def is_asymmetric(algorithm: str) -> bool:
+    """Проверяет, что алгоритм подписи использует пару ключей, а не общий секрет"""
+    return not algorithm.upper().startswith("HS")
+
+
+class JWTKeyRing:
+    """Набор ключей подписи и проверки JWT текущего процесса"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Сбрасывает загруженные ключи"""
+        self.enabled = False
+        self.algorithm: t.Optional[str] = None
+        self.active_kid: t.Optional[str] = None
+        self._signing_keys: dict[str, t.Any] = {}
+        self._verification_keys: dict[str, t.Any] = {}
+        self.jwks: dict = {"keys": []}
+
+    def init_app(self, app: Flask) -> None:
+        """Загружает ключи по настройкам приложения. Для HS алгоритмов ключи не нужны, подписываем секретом"""
+        self.reset()
+        algorithm = app.config.get("JWT_ALGORITHM", "HS256")
+        if not is_asymmetric(algorithm):
+            return
+
+        keys_dir = app.config.get("JWT_KEYS_DIR")
+        if not keys_dir:
+            raise RuntimeError(f"JWT_KEYS_DIR is required for {algorithm}")
+        self.load(Path(keys_dir), algorithm, app.config.get("JWT_ACTIVE_KID"))
+
+    def load(self, keys_dir: Path, algorithm: str, active_kid: t.Optional[str] = None) -> None:
+        """Читает ключи из каталога и собирает JWKS"""
+        for path in sorted(keys_dir.glob(f"*{PRIVATE_KEY_SUFFIX}")):
+            private_key = load_pem_private_key(path.read_bytes(), password=None)
+            self._signing_keys[path.stem] = private_key
+            self._verification_keys[path.stem] = private_key.public_key()
+        for path in sorted(keys_dir.glob(f"*{PUBLIC_KEY_SUFFIX}")):
+            self._verification_keys.setdefault(path.stem, load_pem_public_key(path.read_bytes()))
+
+        if active_kid is None and self._signing_keys:
+            active_kid = max(self._signing_keys)
+        if active_kid not in self._signing_keys:
+            raise RuntimeError(f"Private key for kid '{active_kid}' not found in {keys_dir}")
+
+        self.enabled = True
+        self.algorithm = algorithm
+        self.active_kid = active_kid
+        self.jwks = {"keys": [self._make_jwk(kid, key) for kid, key in self._verification_keys.items()]}
+
+    def _make_jwk(self, kid: str, public_key) -> dict:
+        """Открытый ключ в формате JWK"""
+        jwk = json.loads(get_default_algorithms()[self.algorithm].to_jwk(public_key))
+        jwk.update(kid=kid, alg=self.algorithm, use="sig")
+        return jwk
+
+    @property
+    def signing_key(self):
+        """Закрытый ключ, которым подписываются новые токены"""
+        return self._signing_keys[self.active_kid]
+
+    def get_verification_key(self, kid: t.Optional[str]):
+        """Открытый ключ для проверки токена по kid из его заголовка"""
+        try:
+            return self._verification_keys[kid]
+        except KeyError:
+            raise InvalidTokenError(f"Unknown key id: {kid}")
@@ -0,0 +1,163 @@
+"""
+Хеширование паролей.
+Алгоритм и его стоимость задаются в настройках: pbkdf2(по умолчанию, как в werkzeug), scrypt или argon2.
+Хеш хранит свой алгоритм и параметры, поэтому проверяются пароли с любым из них, а при входе пользователя
+хеш со старыми параметрами пересчитывается под текущие(`needs_rehash`).
+
+Хеширование занимает десятки миллисекунд процессора. Под gevent оно выполняется в своём пуле потоков,
+так блокируется только гринлет запроса, а не весь воркер. Общий пул хаба(через него идёт и резолв DNS) не трогаем.
+hashlib и argon2 на время вычисления отпускают GIL, поэтому потоки пула работают параллельно.
+"""
+
+import hashlib
+import hmac
+import os
+import time
+import typing as t
+
+from flask import Flask
+from werkzeug.security import check_password_hash, gen_salt, generate_password_hash
+
+SALT_LENGTH = 16
+
+
+class PasswordHasher:
+    """Хеширование и проверка паролей выбранным в настройках алгоритмом"""
+
+    def __init__(self):
+        self.method = "pbkdf2"
+        self.pbkdf2_iterations = 260_000
+        self.scrypt_params = (2 ** 15, 8, 1)  # n, r, p
+        self.threads = 4
+        self._argon2 = None
+        self._use_threadpool = False
+        self._threadpool = None
+        self._threadpool_pid: t.Optional[int] = None
+
+    def init_app(self, app: Flask) -> None:
+        """Настраивает алгоритм по настройкам приложения"""
+        self.configure(
+            method=app.config.get("PASSWORD_HASH_METHOD", "pbkdf2"),
+            pbkdf2_iterations=app.config.get("PASSWORD_PBKDF2_ITERATIONS", 260_000),
+            scrypt_params=(
+                app.config.get("PASSWORD_SCRYPT_N", 2 ** 15),
+                app.config.get("PASSWORD_SCRYPT_R", 8),
+                app.config.get("PASSWORD_SCRYPT_P", 1),
+            ),
+            argon2_params=dict(
+                time_cost=app.config.get("PASSWORD_ARGON2_TIME_COST", 3),
+                memory_cost=app.config.get("PASSWORD_ARGON2_MEMORY_COST", 65536),
+                parallelism=app.config.get("PASSWORD_ARGON2_PARALLELISM", 4),
+            ),
+        )
+        self.threads = app.config.get("PASSWORD_HASH_THREADS", 4)
+        if self._threadpool is not None:
+            self._threadpool.kill()  # размер пула мог измениться
+            self._threadpool = None
+        self._use_threadpool = self.threads > 0 and self._is_gevent()
+
+    def configure(
+        self,
+        method: str,
+        pbkdf2_iterations: int = 260_000,
+        scrypt_params: tuple[int, int, int] = (2 ** 15, 8, 1),
+        argon2_params: t.Optional[dict] = None,
+    ) -> None:
+        """Задаёт алгоритм и его параметры. argon2_params - time_cost, memory_cost(KiB), parallelism"""
+        self.method = method
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.scrypt_params = scrypt_params
+        self._argon2 = None
+        if method == "argon2":
+            # argon2-cffi нужен только если выбран argon2
+            from argon2 import PasswordHasher as Argon2Hasher
+
+            self._argon2 = Argon2Hasher(**(argon2_params or {}))
+
+    def measure(self, min_time: float = 1.0) -> float:
+        """Замеряет среднее время одного хеширования в секундах, в текущем потоке, т.е на одном ядре"""
+        count, started = 0, time.perf_counter()
+        while True:
+            self._hash("benchmark-password")
+            count += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time and count >= 3:
+                return elapsed / count
+
+    @staticmethod
+    def _is_gevent() -> bool:
+        """Проверяет, что процесс работает под gevent(см. core/wsgi_app.py)"""
+        try:
+            from gevent import monkey
+        except ImportError:
+            return False
+        return monkey.is_module_patched("threading")
+
+    def _run(self, func: t.Callable, *args) -> t.Any:
+        """Под gevent выполняет вычисление в своём пуле потоков, иначе в текущем потоке"""
+        if not self._use_threadpool:
+            return func(*args)
+        return self._get_threadpool().apply(func, args)
+
+    def _get_threadpool(self):
+        """Пул потоков хеширования. Создаётся при первом хешировании в процессе:
+        приложение могло быть создано до fork воркера, а потоки через fork не переносятся
+        """
+        if self._threadpool is None or self._threadpool_pid != os.getpid():
+            from gevent.threadpool import ThreadPool
+
+            self._threadpool = ThreadPool(self.threads)
+            self._threadpool_pid = os.getpid()
+        return self._threadpool
+
+    def hash(self, password: str) -> str:
+        """Возвращает хеш пароля текущим алгоритмом"""
+        return self._run(self._hash, password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Проверяет пароль по хешу, алгоритм определяется по самому хешу"""
+        return self._run(self._verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Проверяет, что хеш посчитан другим алгоритмом или с другими параметрами"""
+        if self.method == "argon2":
+            return not password_hash.startswith("$argon2") or self._argon2.check_needs_rehash(password_hash)
+        return not password_hash.startswith(f"{self._get_method_prefix()}$")
+
+    def _get_method_prefix(self) -> str:
+        """Алгоритм с параметрами, которые записываются в начало хеша"""
+        if self.method == "scrypt":
+            n, r, p = self.scrypt_params
+            return f"scrypt:{n}:{r}:{p}"
+        return f"pbkdf2:sha256:{self.pbkdf2_iterations}"
+
+    def _hash(self, password: str) -> str:
+        if self.method == "argon2":
+            return self._argon2.hash(password)
+        if self.method == "scrypt":
+            salt = gen_salt(SALT_LENGTH)
+            return f"{self._get_method_prefix()}${salt}${self._scrypt(password, salt, *self.scrypt_params)}"
+        return generate_password_hash(password, method=self._get_method_prefix(), salt_length=SALT_LENGTH)
+
+    def _verify(self, password_hash: str, password: str) -> bool:
+        if password_hash.startswith("$argon2"):
+            return self._verify_argon2(password_hash, password)
+        if password_hash.startswith("scrypt:"):
+            method, salt, hashval = password_hash.split("$", 2)
+            n, r, p = (int(param) for param in method.split(":")[1:])
+            return hmac.compare_digest(self._scrypt(password, salt, n, r, p), hashval)
+        return check_password_hash(password_hash, password)
+
+    def _verify_argon2(self, password_hash: str, password: str) -> bool:
+        from argon2 import PasswordHasher as Argon2Hasher
+        from argon2.exceptions import InvalidHash, VerificationError
+
+        try:
+            return (self._argon2 or Argon2Hasher()).verify(password_hash, password)
+        except (VerificationError, InvalidHash):
+            return False
+
+    @staticmethod
+    def _scrypt(password: str, salt: str, n: int, r: int, p: int) -> str:
+        """scrypt в том же формате, что и в werkzeug>=2.3: "scrypt:n:r:p$salt$hex" """
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=132 * n * r * p).hex()
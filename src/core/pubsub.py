@@ -0,0 +1,106 @@
+"""
+Обмен сообщениями между воркерами gunicorn и подами сервиса через redis pub/sub.
+Используется для синхронизации локальных(in-process) кешей и фильтров.
+"""
+
+import threading
+import time
+import typing as t
+from collections import defaultdict
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from .logger import auth_logger
+
+Handler = t.Callable[[str], None]
+
+
+class PubSub:
+    """Подписка на каналы redis и рассылка сообщений по ним.
+    Сообщения читаются в фоновом потоке(под gevent это гринлет) и передаются зарегистрированным обработчикам.
+    Пока redis не подключен, сообщения доставляются только обработчикам текущего процесса.
+    """
+
+    def __init__(self):
+        self.redis: t.Optional[Redis] = None
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+        self._reconnect_handlers: list[t.Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._listener: t.Optional[threading.Thread] = None
+
+    def init_redis(self, redis: Redis) -> None:
+        """Подключаем redis, через него будут ходить сообщения"""
+        self.redis = redis
+        self._ensure_listener()
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Регистрирует обработчик сообщений канала"""
+        with self._lock:
+            self._handlers[channel].append(handler)
+        self._ensure_listener()
+
+    def on_reconnect(self, handler: t.Callable[[], None]) -> None:
+        """Регистрирует обработчик, который вызывается после каждой (пере)подписки на каналы.
+        Пока подписки не было сообщения могли быть потеряны, поэтому подписчику стоит перечитать своё состояние
+        """
+        with self._lock:
+            self._reconnect_handlers.append(handler)
+
+    def publish(self, channel: str, message: str) -> None:
+        """Отправляет сообщение в канал"""
+        if self.redis is None:
+            self._dispatch(channel, message)
+        else:
+            self.redis.publish(channel, message)
+
+    def _dispatch(self, channel: str, message: str) -> None:
+        """Передаёт сообщение обработчикам канала"""
+        with self._lock:
+            handlers = list(self._handlers.get(channel, []))
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                auth_logger.error(f"Ошибка при обработке сообщения из канала {channel}\n{str(e)}")
+
+    def _ensure_listener(self) -> None:
+        """Запускает фоновый поток чтения сообщений, если он ещё не запущен"""
+        with self._lock:
+            if self.redis is None or not self._handlers or self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="redis-pubsub", daemon=True)
+        self._listener.start()
+
+    def _listen(self) -> None:
+        """Цикл чтения сообщений. При ошибках redis переподписываемся через секунду"""
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            subscribed: set[str] = set()
+            try:
+                while True:
+                    with self._lock:
+                        channels = set(self._handlers) - subscribed
+                    if channels:
+                        pubsub.subscribe(*channels)
+                        if not subscribed:
+                            self._notify_reconnect()
+                        subscribed |= channels
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._dispatch(message["channel"], message["data"])
+            except RedisError as e:
+                auth_logger.error(f"Потеряно соединение с redis pub/sub\n{str(e)}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def _notify_reconnect(self) -> None:
+        """Вызывает обработчики переподключения"""
+        with self._lock:
+            handlers = list(self._reconnect_handlers)
+        for handler in handlers:
+            try:
+                handler()
+            except Exception as e:
+                auth_logger.error(f"Ошибка в обработчике переподключения к redis pub/sub\n{str(e)}")
@@ -0,0 +1,111 @@
+"""
+Пулы соединений с redis.
+На каждый процесс(воркер gunicorn) и каждый url создаётся ровно один пул, все клиенты redis в воркере
+берут соединения из него. Так количество соединений с redis на воркер ограничено сверху `REDIS_MAX_CONNECTIONS`,
+а таймауты не дают зависшему redis заблокировать все гринлеты воркера.
+"""
+
+import threading
+import typing as t
+
+from redis import BlockingConnectionPool, ConnectionPool, Redis
+
+from .config import settings
+
+REDIS_URL_SCHEMES = ("redis://", "rediss://", "unix://")
+
+_pools: dict[tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_options() -> dict:
+    """Возвращает общие для всех пулов настройки соединений"""
+    return dict(
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
+def get_redis_pool(url: str, decode_responses: bool = True) -> ConnectionPool:
+    """Возвращает пул соединений для переданного url, при первом обращении пул создаётся.
+    В блокирующем режиме при исчерпании пула клиент ждёт свободное соединение `REDIS_POOL_TIMEOUT` секунд,
+    в обычном режиме сразу получает ошибку.
+    """
+    key = (url, decode_responses)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = get_pool_options()
+            if settings.REDIS_POOL_BLOCKING:
+                pool = BlockingConnectionPool.from_url(
+                    url, decode_responses=decode_responses, timeout=settings.REDIS_POOL_TIMEOUT, **options
+                )
+            else:
+                pool = ConnectionPool.from_url(url, decode_responses=decode_responses, **options)
+            _pools[key] = pool
+    return pool
+
+
+def get_redis_client(url: str, decode_responses: bool = True) -> Redis:
+    """Возвращает клиент redis работающий через общий пул соединений"""
+    return Redis(connection_pool=get_redis_pool(url, decode_responses=decode_responses))
+
+
+def get_redis_cluster_client(url: str, decode_responses: bool = True) -> Redis:
+    """Возвращает клиент Redis Cluster, url указывает на любой из узлов кластера.
+    Количество соединений ограничивается `REDIS_MAX_CONNECTIONS` на каждый узел кластера
+    """
+    from rediscluster import RedisCluster
+
+    options = get_pool_options()
+    return RedisCluster.from_url(
+        url, decode_responses=decode_responses, skip_full_coverage_check=True, max_connections_per_node=True, **options
+    )
+
+
+def get_limiter_storage_options(storage_url: t.Optional[str]) -> dict:
+    """Формирует настройки хранилища для flask_limiter.
+    Если лимитер смотрит в тот же redis, что и хранилище токенов, то отдаём ему тот же пул соединений,
+    иначе передаём те же настройки пула, чтобы и у лимитера количество соединений было ограничено.
+    """
+    if not storage_url or not storage_url.startswith(REDIS_URL_SCHEMES):
+        return {}
+    if storage_url == settings.JWT_REDIS_URL:
+        return {"connection_pool": get_redis_pool(storage_url)}
+    return get_pool_options()
+
+
+def _get_pool_stats(pool: ConnectionPool) -> dict:
+    """Возвращает статистику использования одного пула"""
+    if isinstance(pool, BlockingConnectionPool):
+        created = len(pool._connections)
+        available = len([conn for conn in pool.pool.queue if conn is not None])
+    else:
+        created = pool._created_connections
+        available = len(pool._available_connections)
+    return {
+        "max_connections": pool.max_connections,
+        "created_connections": created,
+        "available_connections": available,
+        "in_use_connections": created - available,
+    }
+
+
+def get_pools_stats() -> list[dict]:
+    """Возвращает статистику использования всех пулов текущего воркера.
+    url в статистику не попадает, т.к может содержать пароль
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [
+        {
+            "host": pool.connection_kwargs.get("host", pool.connection_kwargs.get("path")),
+            "db": pool.connection_kwargs.get("db"),
+            "blocking": isinstance(pool, BlockingConnectionPool),
+            **_get_pool_stats(pool),
+        }
+        for pool in pools
+    ]
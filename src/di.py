@@ -1,10 +1,12 @@
-import redis
 from flask_injector import request
 from injector import Binder, Module, singleton
 
+from core import pubsub
 from core.config import settings
+from core.redis_pool import get_redis_client, get_redis_cluster_client
 from services import AuthService, JWTService, RoleService, UserService
-from storage import JWTRedisStorage, JWTStorage
+from storage import (JWTMemoryStorage, JWTRedisClusterStorage,
+                     JWTRedisCompactStorage, JWTRedisStorage, JWTStorage)
 
 
 class ServiceInjector(Module):
@@ -12,11 +14,36 @@ class ServiceInjector(Module):
     Для DI используется библиотека flask-injector
     """
     def configure(self, binder: Binder) -> None:
-        redis_client = redis.Redis.from_url(url=settings.JWT_REDIS_URL, decode_responses=True)
-        jwt_redis_storage = JWTRedisStorage(redis=redis_client)
+        jwt_storage = self.make_jwt_storage()
 
         binder.bind(interface=UserService, to=UserService, scope=request)
         binder.bind(interface=AuthService, to=AuthService, scope=request)
         binder.bind(interface=JWTService, to=JWTService, scope=request)
         binder.bind(interface=RoleService, to=RoleService, scope=request)
-        binder.bind(interface=JWTStorage, to=jwt_redis_storage, scope=singleton)
+        binder.bind(interface=JWTStorage, to=jwt_storage, scope=singleton)
+
+    @staticmethod
+    def make_jwt_storage() -> JWTStorage:
+        """Создаёт хранилище токенов выбранное в настройках `JWT_STORAGE`"""
+        if settings.JWT_STORAGE == "memory":
+            return JWTMemoryStorage()
+
+        if settings.JWT_STORAGE == "redis_cluster":
+            redis_client = get_redis_cluster_client(url=settings.JWT_REDIS_URL)
+        else:
+            redis_client = get_redis_client(url=settings.JWT_REDIS_URL)
+        pubsub.init_redis(redis_client)
+        storage_options = dict(
+            redis=redis_client,
+            pubsub=pubsub,
+            revoked_filter_capacity=settings.JWT_REVOKED_FILTER_CAPACITY,
+            revoked_filter_error_rate=settings.JWT_REVOKED_FILTER_ERROR_RATE,
+            revoked_filter_rebuild_interval=settings.JWT_ACCESS_TOKEN_EXPIRES,
+        )
+
+        if settings.JWT_STORAGE == "redis_cluster":
+            return JWTRedisClusterStorage(**storage_options)
+        if settings.JWT_REDIS_COMPACT:
+            binary_redis_client = get_redis_client(url=settings.JWT_REDIS_URL, decode_responses=False)
+            return JWTRedisCompactStorage(binary_redis=binary_redis_client, **storage_options)
+        return JWTRedisStorage(**storage_options)
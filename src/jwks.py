@@ -0,0 +1,16 @@
+from flask import Flask, current_app, jsonify, request
+
+from core import jwt_keys
+
+JWKS_URL = "/.well-known/jwks.json"
+
+
+def init_jwks(app: Flask):
+    @app.route(JWKS_URL)
+    def get_jwks():
+        """Открытые ключи проверки JWT. Ключи меняются только при ротации, поэтому ответ кешируется надолго"""
+        response = jsonify(jwt_keys.jwks)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get("JWT_JWKS_MAX_AGE", 24 * 60 * 60)
+        response.add_etag()
+        return response.make_conditional(request)
@@ -0,0 +1,91 @@
+"""partition login_history by month
+
+Revision ID: 9d2f6a4c8e13
+Revises: 5b0e3c7a1f24
+Create Date: 2026-10-18 14:02:17.540913
+
+Только для postgres: login_history пересоздаётся секционированной по месяцам(RANGE по date),
+данные переносятся из старой таблицы. Первичный ключ секционированной таблицы обязан включать ключ
+секционирования, поэтому он становится (id, date). Секция по умолчанию принимает записи, для месяца которых
+секции ещё нет, её должна держать пустой команда `flask login_history_maintain`.
+PREMAKE_MONTHS задаёт только секции, созданные самой миграцией. Дальше секции создаёт команда,
+и запас секций впрок определяет настройка LOGIN_HISTORY_PREMAKE_MONTHS.
+На sqlite миграция ничего не делает, там старая история удаляется той же командой пачками.
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6a4c8e13'
+down_revision = '5b0e3c7a1f24'
+branch_labels = None
+depends_on = None
+
+PREMAKE_MONTHS = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def create_partitions(bind):
+    """Секции по месяцам от самой старой записи и на несколько месяцев вперёд"""
+    first_date = bind.execute(sa.text('SELECT min(date) FROM login_history')).scalar()
+    month = (first_date or datetime.datetime.now()).date().replace(day=1)
+    last_month = add_months(datetime.date.today().replace(day=1), PREMAKE_MONTHS)
+    while month <= last_month:
+        op.execute(
+            f"CREATE TABLE login_history_y{month.year}m{month.month:02d} PARTITION OF login_history_new "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        )
+        month = add_months(month, 1)
+    op.execute('CREATE TABLE login_history_default PARTITION OF login_history_new DEFAULT')
+
+
+def recreate_login_history(partitioned):
+    """Создаёт новую таблицу рядом со старой, переносит в неё данные и заменяет ею старую.
+    Перенос идёт одним INSERT ... SELECT, на большой таблице миграцию стоит запускать в окно обслуживания
+    """
+    op.drop_index('ix_login_history_user_id_date', table_name='login_history')
+    constraints = [sa.PrimaryKeyConstraint('id', 'date', name='login_history_new_pkey')] if partitioned else [
+        sa.PrimaryKeyConstraint('id', name='login_history_new_pkey'),
+        sa.UniqueConstraint('id', name='login_history_new_id_key'),
+    ]
+    op.create_table('login_history_new',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('user_agent', sa.Text(), nullable=False),
+    sa.Column('ip', sa.Text(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='login_history_new_user_id_fkey'),
+    *constraints,
+    **({'postgresql_partition_by': 'RANGE (date)'} if partitioned else {})
+    )
+    if partitioned:
+        create_partitions(op.get_bind())
+    op.execute(
+        'INSERT INTO login_history_new (id, user_id, user_agent, ip, date) '
+        'SELECT id, user_id, user_agent, ip, date FROM login_history'
+    )
+    op.drop_table('login_history')
+    op.rename_table('login_history_new', 'login_history')
+    for constraint in ('pkey', 'user_id_fkey') + (() if partitioned else ('id_key',)):
+        op.execute(f'ALTER TABLE login_history RENAME CONSTRAINT login_history_new_{constraint} '
+                   f'TO login_history_{constraint}')
+    op.create_index('ix_login_history_user_id_date', 'login_history', ['user_id', 'date'], unique=False)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    recreate_login_history(partitioned=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    recreate_login_history(partitioned=False)
@@ -0,0 +1,75 @@
+"""native uuid ids, drop duplicate unique constraints on ids
+
+Revision ID: b6e4d2a8c915
+Revises: a3c71e5b9f02
+Create Date: 2026-10-18 18:40:52.207341
+
+Только для postgres: id пользователей, ролей и истории входов и ссылки на них переводятся из varchar(36)
+в uuid, unique ограничения на id, дублирующие первичный ключ, удаляются. На sqlite id остаются строками.
+
+Удаление ограничений мгновенное. Смена типа переписывает таблицы под блокировкой, поэтому ожидание
+блокировки ограничено lock_timeout: миграция падает, а не останавливает запросы к таблицам, её можно повторить.
+Внешние ключи пересоздаются обычными, с проверкой: таблицы и так заблокированы сменой типа до конца миграции,
+а NOT VALID внешний ключ на секционированной login_history postgres 13 не поддерживает.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e4d2a8c915'
+down_revision = 'a3c71e5b9f02'
+branch_labels = None
+depends_on = None
+
+LOCK_TIMEOUT = '5s'
+
+# таблица, ограничение unique(id)
+ID_UNIQUE_CONSTRAINTS = [
+    ('roles', 'roles_id_key'),
+    ('users', 'users_id_key'),
+    ('login_history', 'login_history_id_key'),  # у секционированной таблицы его уже нет
+]
+# таблица, колонки
+UUID_COLUMNS = [
+    ('users', ['id']),
+    ('roles', ['id']),
+    ('user_role', ['user_id', 'role_id']),
+    ('login_history', ['id', 'user_id']),
+]
+# таблица, ограничение, колонка, ссылка
+FOREIGN_KEYS = [
+    ('user_role', 'user_role_user_id_fkey', 'user_id', 'users(id)'),
+    ('user_role', 'user_role_role_id_fkey', 'role_id', 'roles(id)'),
+    ('login_history', 'login_history_user_id_fkey', 'user_id', 'users(id)'),
+]
+
+
+def change_type(column_type):
+    """Меняет тип колонок id и ссылок на них, внешние ключи на время смены типа удаляются"""
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    for table, constraint, _, _ in FOREIGN_KEYS:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {constraint}')
+    for table, columns in UUID_COLUMNS:
+        op.execute(f'ALTER TABLE {table} ' + ', '.join(
+            f'ALTER COLUMN {column} TYPE {column_type} USING {column}::{column_type}' for column in columns
+        ))
+    for table, constraint, column, reference in FOREIGN_KEYS:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {constraint} FOREIGN KEY ({column}) REFERENCES {reference}')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, constraint in ID_UNIQUE_CONSTRAINTS:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}')
+    change_type('uuid')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    change_type('varchar(36)')
+    for table, constraint in ID_UNIQUE_CONSTRAINTS:
+        if table == 'login_history':
+            continue  # на секционированной таблице unique должен включать date, его нет и до миграции
+        op.create_unique_constraint(constraint, table, ['id'])
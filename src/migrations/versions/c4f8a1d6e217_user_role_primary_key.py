@@ -0,0 +1,85 @@
+"""user_role primary key and role_id index
+
+Revision ID: c4f8a1d6e217
+Revises: b6e4d2a8c915
+Create Date: 2026-10-18 20:12:36.904415
+
+Уникальное ограничение (user_id, role_id) заменяется первичным ключом, для выборки пользователей роли
+добавляется индекс по role_id. login_history.user_id уже покрыт индексом (user_id, date).
+
+В postgres CHECK (... IS NOT NULL) добавляется NOT VALID и сразу коммитится: блокировка таблицы держится
+только на время добавления. Дальше вне транзакции миграции, каждая команда в своей транзакции и без блокировки
+записи: удаляются связи с null, проверяются CHECK и строятся индексы CREATE INDEX CONCURRENTLY.
+Первичный ключ создаётся по готовому уникальному индексу, а NOT NULL опирается на проверенный CHECK,
+поэтому под короткой блокировкой таблица не сканируется. Ожидание блокировки ограничено lock_timeout.
+Если CONCURRENTLY прервался, то остаётся невалидный индекс, его нужно удалить и повторить миграцию.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a1d6e217'
+down_revision = 'b6e4d2a8c915'
+branch_labels = None
+depends_on = None
+
+LOCK_TIMEOUT = '5s'
+COLUMNS = ('user_id', 'role_id')
+
+
+def upgrade_postgresql():
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    op.execute('ALTER TABLE user_role ' + ', '.join(
+        f'ADD CONSTRAINT user_role_{column}_not_null CHECK ({column} IS NOT NULL) NOT VALID' for column in COLUMNS
+    ))
+    with op.get_context().autocommit_block():
+        # связи без пользователя или роли не имеют смысла, а в первичном ключе null недопустим
+        op.execute('DELETE FROM user_role WHERE user_id IS NULL OR role_id IS NULL')
+        for column in COLUMNS:
+            op.execute(f'ALTER TABLE user_role VALIDATE CONSTRAINT user_role_{column}_not_null')
+        op.execute('CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_role_pkey ON user_role (user_id, role_id)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_role_role_id ON user_role (role_id)')
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    op.execute('ALTER TABLE user_role ALTER COLUMN user_id SET NOT NULL, ALTER COLUMN role_id SET NOT NULL')
+    op.execute('ALTER TABLE user_role ADD CONSTRAINT user_role_pkey PRIMARY KEY USING INDEX user_role_pkey')
+    op.execute('ALTER TABLE user_role DROP CONSTRAINT uniq_user_role, '
+               'DROP CONSTRAINT user_role_user_id_not_null, DROP CONSTRAINT user_role_role_id_not_null')
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        upgrade_postgresql()
+        return
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.execute('DELETE FROM user_role WHERE user_id IS NULL OR role_id IS NULL')
+    with op.batch_alter_table('user_role', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.String(length=36), nullable=False)
+        batch_op.alter_column('role_id', existing_type=sa.String(length=36), nullable=False)
+        batch_op.drop_constraint('uniq_user_role', type_='unique')
+        batch_op.create_primary_key('user_role_pkey', ['user_id', 'role_id'])
+        batch_op.create_index('ix_user_role_role_id', ['role_id'], unique=False)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_user_role_role_id')
+            op.execute('CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uniq_user_role ON user_role (user_id, role_id)')
+        op.execute('ALTER TABLE user_role ADD CONSTRAINT uniq_user_role UNIQUE USING INDEX uniq_user_role, '
+                   'DROP CONSTRAINT user_role_pkey, '
+                   'ALTER COLUMN user_id DROP NOT NULL, ALTER COLUMN role_id DROP NOT NULL')
+        return
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('user_role', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_role_role_id')
+        batch_op.drop_constraint('user_role_pkey', type_='primary')
+        batch_op.create_unique_constraint('uniq_user_role', ['user_id', 'role_id'])
+        batch_op.alter_column('user_id', existing_type=sa.String(length=36), nullable=True)
+        batch_op.alter_column('role_id', existing_type=sa.String(length=36), nullable=True)
+
+    # ### end Alembic commands ###
@@ -1,2 +1,4 @@
 from .login_history import LoginHistory  # noqa
+from .principal import UserPrincipal  # noqa
 from .user import Role, RoleSchema, User, UserSchema  # noqa
+from .user_agent import UserAgent  # noqa
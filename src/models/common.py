@@ -1,18 +1,42 @@
 import datetime
 import uuid
 
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
 from core import db
 
 
+class GUID(TypeDecorator):
+    """UUID, который в pg хранится нативным типом uuid(16 байт), а в остальных бд строкой из 36 символов.
+    В python значение всегда строка в каноническом виде, как и раньше с String(36)
+    """
+
+    impl = db.String(length=36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(db.String(length=36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return str(uuid.UUID(str(value)))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(value)
+
+
 class UUIDMixin:
-    """Миксин для добавления в модели первичного ключа в формате UUID
-    Здесь сами эмулируем UUID, а не используем тип UUID из sqlalchemy.dialects.postgresql потому что он
-    работает только в pg, а хотелось бы еще поддержку других бд.
+    """Миксин для добавления в модели первичного ключа в формате UUID.
+    Первичный ключ уже уникален, отдельный unique индекс на id не нужен
     """
 
-    id = db.Column(
-        db.String(length=36), primary_key=True, default=lambda: str(uuid.uuid4()), unique=True, nullable=False
-    )
+    id = db.Column(GUID(), primary_key=True, default=lambda: str(uuid.uuid4()), nullable=False)
 
 
 class TimeStampedMixin:
@@ -2,17 +2,25 @@ import datetime
 
 from core import db
 
-from .common import UUIDMixin
+from .common import GUID, UUIDMixin
+from .user_agent import UserAgent
 
 
 class LoginHistory(db.Model, UUIDMixin):
     """Модель для таблицы, которая будет хранить историю пользовательских логинов"""
     __tablename__ = "login_history"
+    # история пользователя читается от новых записей к старым
+    __table_args__ = (db.Index("ix_login_history_user_id_date", "user_id", "date"),)
 
-    user_id = db.Column(db.String(length=36), db.ForeignKey("users.id"), nullable=False)
-    user_agent = db.Column(db.Text, nullable=False)
+    user_id = db.Column(GUID(), db.ForeignKey("users.id"), nullable=False)
+    user_agent_id = db.Column(db.Integer, db.ForeignKey("user_agents.id"), nullable=False)
     ip = db.Column(db.Text, nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    agent = db.relationship(UserAgent, lazy="joined", innerjoin=True)
+
+    @property
+    def user_agent(self) -> str:
+        return self.agent.value
 
     def __repr__(self):
         return f"User {self.user_id} logged in {self.timestamp}"
@@ -0,0 +1,60 @@
+"""
+Текущий пользователь запроса(`current_user`), собранный из claims access токена.
+Большинству обработчиков нужны только id и роли пользователя, а они есть в токене.
+Модель пользователя загружается из бд только при обращении к остальным её полям и методам.
+"""
+
+import typing as t
+
+from flask_jwt_extended.exceptions import UserLookupError
+
+from .user import User
+
+
+class UserPrincipal:
+    """Легковесный пользователь на основе claims токена.
+    Атрибуты, которых нет у principal, берутся у модели `User`, модель загружается один раз при первом обращении.
+    user_loader - загрузка модели по id, roles_loader - роли из claims, если они актуальны, иначе None
+    """
+
+    __slots__ = ("id", "claims", "_user", "_roles", "_user_loader", "_roles_loader")
+
+    def __init__(
+        self,
+        claims: dict,
+        user_loader: t.Callable[[str], t.Optional[User]],
+        roles_loader: t.Callable[[dict], t.Optional[list[str]]],
+    ):
+        self.id = claims["sub"]
+        self.claims = claims
+        self._user: t.Optional[User] = None
+        self._roles: t.Optional[list[str]] = None
+        self._user_loader = user_loader
+        self._roles_loader = roles_loader
+
+    @property
+    def user(self) -> User:
+        """Модель пользователя из бд. Если пользователя в бд нет, то ответом будет 401, как и без principal"""
+        if self._user is None:
+            self._user = self._user_loader(self.id)
+            if self._user is None:
+                raise UserLookupError(f"User {self.id} not found", {}, self.claims)
+        return self._user
+
+    def get_roles(self) -> list[str]:
+        """Роли пользователя: из токена, если с момента его выпуска роли не менялись, иначе из бд"""
+        if self._roles is None:
+            self._roles = self._roles_loader(self.claims)
+            if self._roles is None:
+                self._roles = self.user.get_roles()
+        return self._roles
+
+    def has_role(self, role_name: str) -> bool:
+        """Метод для проверки есть ли у пользователя определённая роль"""
+        return role_name in self.get_roles()
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(self.user, name)
+
+    def __repr__(self):
+        return f"<UserPrincipal {self.id}>"
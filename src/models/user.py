@@ -1,19 +1,16 @@
-from flask import current_app
-from marshmallow import EXCLUDE, validates
-from werkzeug.security import check_password_hash, generate_password_hash
+from marshmallow import EXCLUDE
 
-from core import db, ma
-from core.logger import auth_logger
-from exceptions import DBValidationException
+from core import db, ma, password_hasher
 
-from .common import TimeStampedMixin, UUIDMixin
+from .common import GUID, TimeStampedMixin, UUIDMixin
 
 # таблица для many-to-many связи между User и Role
+# первичный ключ (user_id, role_id) служит и индексом для ролей пользователя, для пользователей роли отдельный индекс
 user_role = db.Table(
     "user_role",
-    db.Column("user_id", db.String(36), db.ForeignKey("users.id")),
-    db.Column("role_id", db.String(36), db.ForeignKey("roles.id")),
-    db.UniqueConstraint("user_id", "role_id", name="uniq_user_role")
+    db.Column("user_id", GUID(), db.ForeignKey("users.id"), primary_key=True),
+    db.Column("role_id", GUID(), db.ForeignKey("roles.id"), primary_key=True),
+    db.Index("ix_user_role_role_id", "role_id"),
 )
 
 
@@ -79,11 +76,15 @@ class User(db.Model, UUIDMixin, TimeStampedMixin):
     @password.setter
     def password(self, password: str):
         """В поле пароль будет хранится пароль в зашифрованном виде"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def verify_password(self, password: str) -> bool:
         """Метод для проверки пользователя"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self) -> bool:
+        """Метод проверяет, посчитан ли хеш пароля устаревшим алгоритмом или с устаревшими параметрами"""
+        return password_hasher.needs_rehash(self.password_hash)
 
     def get_roles(self) -> list[Role]:
         """Метод возвращает список ролей пользователя"""
@@ -96,7 +97,7 @@ class User(db.Model, UUIDMixin, TimeStampedMixin):
 
 class UserSchema(ma.SQLAlchemyAutoSchema):
     """Класс для валидации создаваемой модели User(пользователь),
-    перед записью в бд. Проверяет на существующие username и email
+    перед записью в бд. Уникальность username и email проверяет сама бд при вставке
     """
 
     class Meta:
@@ -104,30 +105,12 @@ class UserSchema(ma.SQLAlchemyAutoSchema):
         exclude = ("password_hash",)
         unknown = EXCLUDE
 
-    @validates("username")
-    def validate_username(self, value):
-        if current_app.user_service.is_username_registered(value):
-            auth_logger.debug(f"Ошибка регистрации пользователя. Username {value} уже занято")
-            raise DBValidationException("Username already exists.")
-
-    @validates("email")
-    def validate_email(self, value):
-        if current_app.user_service.is_email_registered(value):
-            auth_logger.debug(f"Ошибка регистрации пользователя. Email {value} уже использован")
-            raise DBValidationException("Email is already registered.")
-
 
 class RoleSchema(ma.SQLAlchemyAutoSchema):
     """Класс для валидации создаваемой модели Role(роль пользователя),
-    перед записью в бд.
+    перед записью в бд. Уникальность названия проверяет сама бд при вставке
     """
 
     class Meta:
         model = Role
         unknown = EXCLUDE
-
-    @validates("name")
-    def validate_role_name(self, value):
-        if Role.query.filter_by(name=value).first():
-            auth_logger.debug(f"Ошибка создания роли. name {value} уже занято")
-            raise DBValidationException("Role's name already exists.")
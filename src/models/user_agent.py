@@ -0,0 +1,23 @@
+import hashlib
+
+from core import db
+
+
+class UserAgent(db.Model):
+    """Справочник User-Agent для истории входов.
+    Различных User-Agent немного, поэтому строка хранится один раз, а история ссылается на неё по id.
+    Строка может быть длинной, поэтому уникальность обеспечивается по её хешу
+    """
+    __tablename__ = "user_agents"
+
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(length=64), nullable=False, unique=True)
+    value = db.Column(db.Text, nullable=False)
+
+    @staticmethod
+    def make_hash(value: str) -> str:
+        """sha256 строки, в миграции на postgres тот же хеш считается в sql"""
+        return hashlib.sha256(value.encode()).hexdigest()
+
+    def __repr__(self):
+        return f"<UserAgent {self.id}>"
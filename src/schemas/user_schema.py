@@ -2,10 +2,33 @@
 Схемы используемые для валидации входящих запросов
 """
 
-from marshmallow import fields, validate
+import datetime
+import uuid
+
+from marshmallow import ValidationError, fields, validate
 
 from core import ma
 
+LOGIN_HISTORY_DEFAULT_LIMIT = 100
+LOGIN_HISTORY_MAX_LIMIT = 1000
+
+
+class LoginHistoryCursor(fields.Field):
+    """Курсор страницы истории входов "<date>,<id>" - дата и id последней записи предыдущей страницы"""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        date, record_id = value
+        return f"{date.isoformat()},{record_id}"
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            date, record_id = value.split(",")
+            return datetime.datetime.fromisoformat(date), str(uuid.UUID(record_id))
+        except (AttributeError, ValueError):
+            raise ValidationError("Cursor must be '<date>,<id>'.")
+
 
 class SignUpSchema(ma.Schema):
     """Схема для валидации входящих данных при регистрации пользователя"""
@@ -57,6 +80,19 @@ class UnassignRoleSchema(ma.Schema):
     user_id = fields.UUID(required=True)
 
 
+class LoginHistoryQuerySchema(ma.Schema):
+    """Схема для валидации параметров запроса истории входов"""
+    after = LoginHistoryCursor()
+    limit = fields.Integer(
+        load_default=LOGIN_HISTORY_DEFAULT_LIMIT, validate=[validate.Range(min=1, max=LOGIN_HISTORY_MAX_LIMIT)]
+    )
+
+
+class LoginHistoryExportSchema(ma.Schema):
+    """Схема для валидации параметров выгрузки истории входов"""
+    format = fields.String(load_default="ndjson", validate=[validate.OneOf(["ndjson", "csv"])])
+
+
 class SimpleResponseSchema(ma.Schema):
     """Схема простого ответа"""
     message = fields.String(required=True)
@@ -1,20 +1,30 @@
+import csv
+import datetime
+import io
 import typing as t
-from http import HTTPStatus
 
-from flask import Response, abort, jsonify, request
+from flask import Response, json, jsonify, request, stream_with_context
 from injector import inject
+from sqlalchemy import tuple_
 from sqlalchemy.exc import SQLAlchemyError
 
 from core import db
 from core.logger import auth_logger
 from exceptions import (DBMaintainException, RefreshTokenInvalid,
                         WrongCredentials)
-from models import LoginHistory, User
+from models import LoginHistory, User, UserAgent
+from schemas import LoginHistoryQuerySchema
 
 import const_messages
 from .jwt_service import JWTService
+from .login_history_writer import login_history_writer
 from .user_service import UserService
 
+# сколько записей истории читается из бд и отдаётся клиенту за раз при выгрузке
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_HEADER = ("user_id", "user_agent", "ip", "date")
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 
 class AuthService:
     """
@@ -39,35 +49,36 @@ class AuthService:
         # сохраняем рефреш токен в бд
         self.token_service.save_refresh_token(token=refresh_token, user_id=user.id)
         auth_logger.debug(f"Создана пар токенов для пользователя с id {user.id}")
-        return access_token, refresh_token
+        return access_token, refresh_token.token
 
     @staticmethod
     def _add_login_history(user: User) -> None:
         """
-        Добавляем запись в историю входов пользователя
+        Добавляем запись в историю входов пользователя.
+        Запись попадает в буфер и пишется в бд в фоне, время входа фиксируем сейчас
         """
-        rec_login_history = LoginHistory()
-        rec_login_history.user_id = user.id
-        rec_login_history.user_agent = request.user_agent.string
-        rec_login_history.ip = request.remote_addr
-        db.session.add(rec_login_history)
-        try:
-            db.session.commit()
-        except SQLAlchemyError as e:
-            # в случае ошибка процесс логина не прерываем, а просто заносим данные в лог в лог
-            auth_logger.error(f"Ошибка при добавлении записи в историю посещений\n{str(e)}")
-            auth_logger.error(f"{rec_login_history.user_id=}/n{rec_login_history.user_agent=}\n{rec_login_history.ip}")
+        login_history_writer.add(
+            user_id=user.id,
+            user_agent=request.user_agent.string,
+            ip=request.remote_addr,
+            date=datetime.datetime.now(),
+        )
 
     def sign_in(self, data: dict) -> Response:
         """Метод выполняет процедуру входа пользователя в сервис
         data - провалидированные данные полученные от пользователя
         """
-        user = self.user_service.get_by_username(data["username"])
+        # роли для токена загружаются отдельно, после чтения их версии
+        user = self.user_service.get_by_username(data["username"], with_roles=False)
         if not user or not user.verify_password(data["password"]):
             auth_logger.debug("Попытка входа с неверными учётными данными")
             raise WrongCredentials(const_messages.EXC_WRONG_CREDENTIALS)
-        self._add_login_history(user)
         access_token, refresh_token = self._make_tokens(user, fresh=True)
+        if user.password_needs_rehash():
+            # пароль известен только при входе, поэтому здесь и переводим хеш на текущий алгоритм
+            self.user_service.change_password(user=user, password=data["password"])
+            auth_logger.debug(f"Хеш пароля пользователя {user.id} пересчитан")
+        self._add_login_history(user)
         return self._make_response(dict(access_token=access_token, refresh_token=refresh_token))
 
     def sign_up(self, data: dict) -> Response:
@@ -82,75 +93,154 @@ class AuthService:
 
     def refresh_jwt(self) -> Response:
         """Метод выполняет процедуру refresh jwt.
-        Если refresh token из запроса есть в бд то всё ок, удаляем его из бд и выдаем новые токены, а если нет то отказ
+        Выпускаем новую пару токенов и в хранилище атомарно заменяем старый refresh token новым.
+        Если старого refresh токена в бд нет, то отказ, а новые токены просто не попадают в бд
         """
-        is_exists, old_refresh_token_jti, user = self.token_service.is_exists_refresh_token()
-        if is_exists:
-            self.token_service.remove_refresh_token(token_jti=old_refresh_token_jti, user_id=user.id)
-            access_token, refresh_token = self._make_tokens(user)
-            return self._make_response(dict(access_token=access_token, refresh_token=refresh_token))
+        old_refresh_token_jti = self.token_service.get_claim_from_token("jti")
+        user = self.token_service.get_current_user()
+        access_token, refresh_token = self.token_service.gen_tokens(user)
+        is_rotated = self.token_service.rotate_refresh_token(
+            old_token_jti=old_refresh_token_jti, new_token=refresh_token, user_id=user.id
+        )
+        if is_rotated:
+            auth_logger.debug(f"Создана пар токенов для пользователя с id {user.id}")
+            return self._make_response(dict(access_token=access_token, refresh_token=refresh_token.token))
         else:
             auth_logger.debug("Попытка получить новый access token по несуществующему refresh токену")
             raise RefreshTokenInvalid(
                 const_messages.EXC_REFRESH_TOKEN_INVALID
             )
 
+    def _revoke_current_access_token(self) -> None:
+        """Отзываем access токен из запроса"""
+        self.token_service.revoke_access_token(
+            token_jti=self.token_service.get_claim_from_token("jti"),
+            token_exp=self.token_service.get_claim_from_token("exp"),
+        )
+
     def logout(self) -> Response:
         """Метод выполняет процедуру выхода из аккаунта с "этого устройства".
-        Ддя этого удаляем refresh токен связанный с access токеном из запроса
+        Ддя этого удаляем refresh токен связанный с access токеном из запроса и отзываем сам access токен
         """
         refresh_jti = self.token_service.get_claim_from_token("rt")
         user_id = self.token_service.get_claim_from_token("sub")
         self.token_service.remove_refresh_token(token_jti=refresh_jti, user_id=user_id)
+        self._revoke_current_access_token()
         return self._make_response({"logout": "ok"})
 
     def logout_all(self) -> Response:
         """Метод выполняет процедуру выхода из аккаунта "со всех устройств".
-        Для этого просто удаляем все refresh токены пользователя
+        Для этого удаляем все refresh токены пользователя и отзываем access токен из запроса.
+        access токены других устройств перестанут действовать когда истечёт их короткий срок жизни
         """
         user_id = self.token_service.get_claim_from_token("sub")
         self.token_service.remove_refresh_tokens(user_id=user_id)
+        self._revoke_current_access_token()
         return self._make_response({"logout_all": "ok"})
 
-    def login_history(self) -> Response:
-        """Метод возвращает историю посещений пользователя".
+    def login_history(self, args: dict) -> Response:
+        """Метод возвращает страницу истории посещений пользователя, от новых входов к старым.
+        Страницы по курсору(keyset): следующая страница начинается после последней записи предыдущей,
+        поэтому запрос идёт по индексу (user_id, date) и не зависит от номера страницы
+        args - провалидированные параметры запроса: after - курсор, limit - размер страницы
         """
         user_id = self.token_service.get_claim_from_token("sub")  # получаем id текущего пользователя
-        query = db.session.query(LoginHistory).filter(LoginHistory.user_id == user_id)
+        login_history_writer.flush()  # входы из буфера этого воркера должны попасть в ответ
+        limit = args["limit"]
+        query = (
+            db.session.query(LoginHistory)
+            .filter(LoginHistory.user_id == user_id)
+            .order_by(LoginHistory.date.desc(), LoginHistory.id.desc())
+        )
+        if args.get("after"):
+            query = query.filter(tuple_(LoginHistory.date, LoginHistory.id) < tuple_(*args["after"]))
         try:
-            history_log = query.all()
+            history_log = query.limit(limit + 1).all()  # лишняя запись показывает, что есть следующая страница
         except SQLAlchemyError as e:
             auth_logger.error(f"Ошибка при запросе истории логинов пользователя {user_id}\n{str(e)}")
             raise DBMaintainException()
-        else:
-            return self._make_response([log.dict() for log in history_log])
+        response = self._make_response([log.dict() for log in history_log[:limit]])
+        if len(history_log) > limit:
+            last = history_log[limit - 1]
+            response.headers["X-Next-Cursor"] = LoginHistoryQuerySchema().dump({"after": (last.date, last.id)})["after"]
+        return response
+
+    def export_login_history(self, args: dict) -> Response:
+        """Метод выгружает всю историю посещений пользователя в NDJSON или CSV, от новых входов к старым.
+        Записи читаются из бд пачками(на postgres через серверный курсор) и сразу отдаются клиенту,
+        так в памяти воркера одновременно находится только одна пачка
+        args - провалидированные параметры запроса: format - формат выгрузки
+        """
+        user_id = self.token_service.get_claim_from_token("sub")  # получаем id текущего пользователя
+        login_history_writer.flush()  # входы из буфера этого воркера должны попасть в выгрузку
+        query = (
+            db.session.query(
+                LoginHistory.user_id, UserAgent.value.label("user_agent"), LoginHistory.ip, LoginHistory.date
+            )
+            .join(LoginHistory.agent)
+            .filter(LoginHistory.user_id == user_id)
+            .order_by(LoginHistory.date.desc(), LoginHistory.id.desc())
+            .yield_per(EXPORT_BATCH_SIZE)
+        )
+        export_format = args["format"]
+        encode_rows = self._encode_csv if export_format == "csv" else self._encode_ndjson
+
+        def generate() -> t.Iterator[str]:
+            if export_format == "csv":
+                yield ",".join(EXPORT_CSV_HEADER) + "\r\n"  # заголовок, строки csv.writer завершает так же
+            rows = []
+            try:
+                for row in query:
+                    rows.append(row)
+                    if len(rows) == EXPORT_BATCH_SIZE:
+                        yield encode_rows(rows)
+                        rows.clear()
+            except SQLAlchemyError as e:
+                # статус ответа уже отправлен, поэтому просто обрываем выгрузку, клиент получит неполный файл
+                auth_logger.error(f"Ошибка при выгрузке истории логинов пользователя {user_id}\n{str(e)}")
+                return
+            if rows:
+                yield encode_rows(rows)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype=EXPORT_MIMETYPES[export_format],
+            headers={"Content-Disposition": f"attachment; filename=login_history.{export_format}"},
+        )
+
+    @staticmethod
+    def _encode_ndjson(rows: list) -> str:
+        """Записи по одному JSON объекту на строку, поля как в login_history, дата в ISO 8601 как и в CSV"""
+        return "".join(json.dumps({**row._asdict(), "date": row.date.isoformat()}) + "\n" for row in rows)
+
+    @staticmethod
+    def _encode_csv(rows: list) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows((row.user_id, row.user_agent, row.ip, row.date.isoformat()) for row in rows)
+        return buffer.getvalue()
 
     def me(self) -> Response:
         """Метод возвращает профиль пользователя".
         """
-        user_id = self.token_service.get_claim_from_token("sub")  # получаем id текущего пользователя
-        user = self.user_service.get_by_id(user_id)
-        if not user:
-            abort(HTTPStatus.NOT_FOUND, description=const_messages.USER_NOT_FOUND.format(user=user_id))
+        user = self.token_service.get_current_user()  # пользователь уже загружен для этого запроса
         return self._make_response(user.dict())
 
     def change_password(self, data: dict) -> Response:
         """Метод для смены пароля"
         data - провалидированные данные полученные от пользователя.
         """
-        user_id = self.token_service.get_claim_from_token("sub")  # получаем id текущего пользователя
-        user = self.user_service.get_by_id(user_id)
-        if not user:
-            auth_logger.debug(f"Попытка смены пароля для пользователя не существующего в бд\n{user.id=}")
-            abort(HTTPStatus.NOT_FOUND, description=const_messages.USER_NOT_FOUND.format(user=user_id))
+        user = self.token_service.get_current_user().user  # модель пользователя текущего запроса
         self.user_service.change_password(user=user, password=data["password"])
         auth_logger.debug(f"Пароль для пользователя {user.id} изменён")
         return self._make_response(const_messages.PASSWORD_CHANGED)
 
     def authorize(self) -> Response:
         """Метод выполняет авторизацию пользователя
-        Пока что просто возвращаем список ролей пользователя
+        Пока что просто возвращаем список ролей пользователя.
+        Если роли пользователя не менялись с момента выпуска токена, то берём их из токена, без запроса в бд
         """
-        user_id = self.token_service.get_claim_from_token("sub")
-        roles = self.user_service.get_user_roles(user_id)
+        roles = self.token_service.get_roles_from_claims(self.token_service.get_claims())
+        if roles is None:
+            user_id = self.token_service.get_claim_from_token("sub")
+            roles = self.user_service.get_user_roles(user_id)
         return self._make_response(roles)
@@ -1,11 +1,19 @@
 import typing as t
+import uuid
+from datetime import datetime, timezone
 
+from flask import current_app
 from flask_jwt_extended import (create_access_token, create_refresh_token,
-                                current_user, get_jti, get_jwt)
+                                current_user, get_jwt)
+from flask_jwt_extended.config import config as jwt_config
 from injector import inject
 
-from models import User
-from storage import JWTStorage
+from models import User, UserPrincipal
+from storage import JWTStorage, TokenInfo
+from utils import decode_roles, encode_roles
+from utils.role_codec import ROLES_DICTIONARY_VERSION_CLAIM, ROLES_MASK_CLAIM
+
+from .user_service import UserService
 
 
 class JWTService:
@@ -14,20 +22,38 @@ class JWTService:
     """
 
     @inject
-    def __init__(self, storage: JWTStorage):
+    def __init__(self, storage: JWTStorage, user_service: UserService):
         self.storage = storage
+        self.user_service = user_service
 
-    def gen_tokens(self, user: User, fresh: bool = False) -> tuple[str, str]:
+    def gen_tokens(self, user: User, fresh: bool = False) -> tuple[str, TokenInfo]:
         """Формируем пару токенов.
         Дополнительный claims
          - `rt` - jti refresh токена, чтобы в будущем знать с каким рефреш токеном связан
         определённый access токен
-         - `ur` - список ролей пользователя, необходимо для авторизации"""
+         - `ur` - список ролей пользователя, необходимо для авторизации.
+         При `JWT_COMPACT_ROLES` вместо него `urm` - маска ролей и `urv` - версия словаря ролей
+         - `rv` - версия ролей пользователя на момент выпуска токена, если она не изменилась, то роли в токене актуальны
+        refresh токен возвращается вместе с его jti и exp, чтобы при сохранении в бд его не пришлось декодировать"""
         refresh_token = self._gen_refresh_token(user)
-        access_claims = {"rt": get_jti(refresh_token), "ur": user.get_roles()}
+        # версию читаем до загрузки ролей, поэтому роли берём из бд сейчас, а не из загруженного ранее user:
+        # если роли изменятся между чтениями, токен получит уже устаревшую версию и роли возьмутся из бд
+        roles_version = self.get_roles_version(user.id)
+        roles = self.user_service.get_role_names(user.id)
+        access_claims = {"rt": refresh_token.jti, "rv": roles_version, **self._gen_roles_claims(roles)}
         access_token = self._gen_access_token(user, fresh, access_claims)
         return access_token, refresh_token
 
+    def _gen_roles_claims(self, roles: list[str]) -> dict:
+        """Формирует claims с ролями пользователя"""
+        if not current_app.config.get("JWT_COMPACT_ROLES"):
+            return {"ur": roles}
+        dictionary = self.user_service.get_role_dictionary()
+        return {
+            ROLES_MASK_CLAIM: encode_roles(roles, dictionary),
+            ROLES_DICTIONARY_VERSION_CLAIM: dictionary.version,
+        }
+
     @staticmethod
     def _gen_access_token(user: object, fresh: bool = False, add_claims: t.Optional[dict] = None) -> str:
         """Генерирует и возвращает access token"""
@@ -37,12 +63,17 @@ class JWTService:
         return access_token
 
     @staticmethod
-    def _gen_refresh_token(user: object, add_claims: t.Optional[dict] = None) -> str:
-        """Генерирует и возвращает access token"""
-        refresh_token = create_refresh_token(user, additional_claims=add_claims)
-        return refresh_token
+    def _gen_refresh_token(user: object, add_claims: t.Optional[dict] = None) -> TokenInfo:
+        """Генерирует и возвращает refresh token.
+        jti и exp задаём сами, так они известны без декодирования только что созданного токена
+        """
+        jti = str(uuid.uuid4())
+        exp = int((datetime.now(timezone.utc) + jwt_config.refresh_expires).timestamp())
+        claims = {**(add_claims or {}), "jti": jti, "exp": exp}
+        refresh_token = create_refresh_token(user, additional_claims=claims)
+        return TokenInfo(token=refresh_token, jti=jti, exp=exp)
 
-    def save_refresh_token(self, token: str, user_id) -> None:
+    def save_refresh_token(self, token: TokenInfo, user_id) -> None:
         """Сохраняем refresh token's jti в бд."""
         self.storage.save_token(token=token, user_id=user_id)
 
@@ -54,15 +85,44 @@ class JWTService:
         """Метод для удаления всех рефреш токенов пользователя из бд"""
         self.storage.remove_all_user_tokens(user_id=user_id)
 
-    def is_exists_refresh_token(self) -> tuple[bool, t.Optional[str], t.Optional["current_user"]]:
-        """Проверяем есть ли в бд токен который прищел в заголовке Authorization.
+    def revoke_access_token(self, token_jti: str, token_exp: int) -> None:
+        """Метод отзывает access токен, до истечения его срока действия он больше не будет приниматься"""
+        self.storage.revoke_access_token(token_jti=token_jti, token_exp=token_exp)
+
+    def rotate_refresh_token(self, old_token_jti: str, new_token: TokenInfo, user_id: str) -> bool:
+        """Метод заменяет в бд старый refresh токен на новый.
+        Возвращает False если старого токена в бд нет, т.е он уже был использован или отозван
+        """
+        return self.storage.rotate_token(old_jti=old_token_jti, new_token=new_token, user_id=user_id)
+
+    def get_roles_version(self, user_id: str) -> str:
+        """Метод возвращает текущую версию ролей пользователя"""
+        return self.storage.get_roles_version(user_id=user_id)
+
+    def bump_roles_version(self, user_id: t.Optional[str] = None) -> None:
+        """Метод меняет версию ролей пользователя, без user_id - всех пользователей.
+        После этого роли в ранее выпущенных access токенах считаются устаревшими
+        """
+        self.storage.bump_roles_version(user_id=user_id)
+
+    def get_roles_from_claims(self, claims: dict) -> t.Optional[list[str]]:
+        """Метод возвращает роли пользователя записанные в токен.
+        None - если роли пользователя с момента выпуска токена менялись и их надо брать из бд
         """
-        jti = get_jwt()["jti"]  # получаем jti токена из заголовка
-        refresh_token = self.storage.get_token_by_jti(token_jti=jti, user_id=current_user.id)
-        if refresh_token:
-            return True, jti, current_user
-        else:
-            return False, None, None
+        if "rv" not in claims or claims["rv"] != self.get_roles_version(claims["sub"]):
+            return None
+        if "ur" in claims:
+            return claims["ur"]
+        if ROLES_MASK_CLAIM in claims:
+            dictionary = self.user_service.get_role_dictionary()
+            if dictionary.version == claims.get(ROLES_DICTIONARY_VERSION_CLAIM):
+                return decode_roles(claims[ROLES_MASK_CLAIM], dictionary)
+        return None
+
+    @staticmethod
+    def get_claims() -> dict:
+        """Метод возвращает все claims токена полученного из запроса"""
+        return get_jwt()
 
     @staticmethod
     def get_claim_from_token(claim: str) -> str:
@@ -70,6 +130,6 @@ class JWTService:
         return get_jwt().get(claim)
 
     @staticmethod
-    def get_current_user() -> User:
-        """Возвращает пользователя из access токена"""
+    def get_current_user() -> UserPrincipal:
+        """Возвращает пользователя из токена. Модель пользователя из бд доступна через атрибут `user`"""
         return current_user
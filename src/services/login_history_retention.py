@@ -0,0 +1,172 @@
+"""
+Срок хранения истории входов.
+В postgres таблица login_history секционирована по месяцам(RANGE по date, см. миграцию 9d2f6a4c8e13):
+секции на ближайшие месяцы создаются заранее, а секции старше срока хранения отсоединяются и удаляются целиком,
+это почти бесплатно в отличие от удаления строк. Если команда долго не запускалась, то записи месяцев без секции
+попадают в секцию по умолчанию: при создании секции они переносятся в неё, а старше срока хранения удаляются.
+Если таблица не секционирована(sqlite), то старые записи удаляются пачками, каждая пачка в своей транзакции,
+чтобы не держать долгих блокировок.
+Запускается командой `flask login_history_maintain`, например раз в сутки по cron.
+"""
+
+import datetime
+import re
+import typing as t
+
+from sqlalchemy import column, delete, select
+from sqlalchemy import table as sa_table
+from sqlalchemy import text
+
+from core import db
+from core.logger import auth_logger
+from models import LoginHistory
+
+PARTITION_NAME_RE = re.compile(r"^login_history_y(\d{4})m(\d{2})$")
+DEFAULT_PARTITION = "login_history_default"
+
+
+class RetentionResult(t.NamedTuple):
+    """Итог обслуживания таблицы"""
+
+    created: list[str]  # созданные секции
+    dropped: list[str]  # удалённые секции
+    deleted: int  # удалённые записи: из таблицы без секций или из секции по умолчанию
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """Первое число месяца, отстоящего от month на months месяцев"""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month: datetime.date) -> str:
+    return f"login_history_y{month.year}m{month.month:02d}"
+
+
+class LoginHistoryRetention:
+    """Создание будущих секций и удаление истории старше retention_months месяцев.
+    Граница хранения это начало месяца: хранится текущий месяц и retention_months полных месяцев до него
+    """
+
+    def __init__(self, retention_months: int, premake_months: int = 3, batch_size: int = 10_000):
+        self.retention_months = retention_months
+        self.premake_months = premake_months
+        self.batch_size = batch_size
+
+    def get_cutoff(self, today: datetime.date) -> datetime.date:
+        """Записи раньше этой даты удаляются"""
+        return add_months(today.replace(day=1), -self.retention_months)
+
+    def run(self, today: t.Optional[datetime.date] = None) -> RetentionResult:
+        today = today or datetime.date.today()
+        if self._is_partitioned():
+            created = self._create_partitions(today)
+            dropped = self._drop_partitions(today)
+            deleted = self._delete_expired(today, DEFAULT_PARTITION) if self._has_default_partition() else 0
+            return RetentionResult(created=created, dropped=dropped, deleted=deleted)
+        return RetentionResult(created=[], dropped=[], deleted=self._delete_expired(today))
+
+    @staticmethod
+    def _is_partitioned() -> bool:
+        if db.engine.dialect.name != "postgresql":
+            return False
+        query = text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('login_history')")
+        return db.session.execute(query).scalar() is not None
+
+    @staticmethod
+    def _get_partitions() -> dict[str, datetime.date]:
+        """Секции по месяцам: название -> первое число месяца. Секция по умолчанию сюда не попадает"""
+        query = text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'login_history'::regclass"
+        )
+        partitions = {}
+        for name in db.session.execute(query).scalars():
+            match = PARTITION_NAME_RE.match(name)
+            if match:
+                partitions[name] = datetime.date(int(match[1]), int(match[2]), 1)
+        return partitions
+
+    @staticmethod
+    def _has_default_partition() -> bool:
+        query = text(f"SELECT to_regclass('{DEFAULT_PARTITION}') IS NOT NULL")
+        return bool(db.session.execute(query).scalar())
+
+    def _get_default_months(self, today: datetime.date) -> set[datetime.date]:
+        """Месяцы в пределах срока хранения, записи которых попали в секцию по умолчанию"""
+        if not self._has_default_partition():
+            return set()
+        query = text(f"SELECT DISTINCT date_trunc('month', date)::date FROM {DEFAULT_PARTITION} WHERE date >= :cutoff")
+        return set(db.session.execute(query, {"cutoff": self.get_cutoff(today)}).scalars())
+
+    def _create_partitions(self, today: datetime.date) -> list[str]:
+        """Создаёт секции с текущего месяца на premake_months месяцев вперёд и для месяцев,
+        записи которых попали в секцию по умолчанию
+        """
+        existing = self._get_partitions()
+        default_months = self._get_default_months(today)
+        months = {add_months(today.replace(day=1), months) for months in range(self.premake_months + 1)}
+        created = []
+        for month in sorted(months | default_months):
+            name = get_partition_name(month)
+            if name in existing:
+                continue
+            bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            if month in default_months:
+                self._create_partition_from_default(name, month, bounds)
+            else:
+                db.session.execute(text(f"CREATE TABLE {name} PARTITION OF login_history {bounds}"))
+            db.session.commit()
+            created.append(name)
+            auth_logger.info(f"Создана секция истории входов {name}")
+        return created
+
+    @staticmethod
+    def _create_partition_from_default(name: str, month: datetime.date, bounds: str) -> None:
+        """Создаёт секцию месяца, записи которого лежат в секции по умолчанию.
+        Пока в ней есть записи месяца, postgres не даст создать секцию, поэтому секция по умолчанию
+        на время переноса отсоединяется. Выполняется в одной транзакции
+        """
+        columns = ", ".join(column.name for column in LoginHistory.__table__.columns)
+        month_filter = "date >= :month_from AND date < :month_to"
+        params = {"month_from": month, "month_to": add_months(month, 1)}
+        db.session.execute(text(f"ALTER TABLE login_history DETACH PARTITION {DEFAULT_PARTITION}"))
+        db.session.execute(text(f"CREATE TABLE {name} PARTITION OF login_history {bounds}"))
+        db.session.execute(text(
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {month_filter}"
+        ), params)
+        db.session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {month_filter}"), params)
+        db.session.execute(text(f"ALTER TABLE login_history ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+        auth_logger.info(f"Записи истории входов за {month:%Y-%m} перенесены из {DEFAULT_PARTITION} в {name}")
+
+    def _drop_partitions(self, today: datetime.date) -> list[str]:
+        """Отсоединяет и удаляет секции, все записи которых старше срока хранения"""
+        cutoff = self.get_cutoff(today)
+        dropped = []
+        for name, month in sorted(self._get_partitions().items(), key=lambda item: item[1]):
+            if add_months(month, 1) > cutoff:
+                continue
+            db.session.execute(text(f"ALTER TABLE login_history DETACH PARTITION {name}"))
+            db.session.execute(text(f"DROP TABLE {name}"))
+            db.session.commit()
+            dropped.append(name)
+            auth_logger.info(f"Удалена секция истории входов {name}")
+        return dropped
+
+    def _delete_expired(self, today: datetime.date, table_name: str = "login_history") -> int:
+        """Удаляет записи старше срока хранения пачками по batch_size.
+        table_name - таблица или её секция, в которой удаляются записи
+        """
+        cutoff = datetime.datetime.combine(self.get_cutoff(today), datetime.time.min)
+        table = sa_table(table_name, column("id"), column("date"))
+        expired_ids = select(table.c.id).where(table.c.date < cutoff).limit(self.batch_size).scalar_subquery()
+        statement = delete(table).where(table.c.id.in_(expired_ids))
+        deleted = 0
+        while True:
+            result = db.session.execute(statement)
+            db.session.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.batch_size:
+                break
+        auth_logger.info(f"Удалено записей истории входов из {table_name} старше {cutoff:%Y-%m-%d}: {deleted}")
+        return deleted
@@ -0,0 +1,153 @@
+"""
+Отложенная запись истории входов.
+Запись истории не должна задерживать вход пользователя, поэтому записи копятся в буфере воркера
+и пишутся в бд пачками одним INSERT в фоновом потоке(под gevent это гринлет): по достижении
+`LOGIN_HISTORY_BATCH_SIZE` записей или раз в `LOGIN_HISTORY_FLUSH_INTERVAL` секунд.
+Буфер ограничен `LOGIN_HISTORY_BUFFER_SIZE`, при переполнении запись выполняется прямо в запросе.
+При остановке воркера буфер сбрасывается в бд.
+Если бд недоступна, то пачка возвращается в буфер и пишется позже. Записи, которые бд отвергает, ищутся делением
+пачки пополам и отбрасываются с записью в лог, чтобы одна плохая запись не останавливала запись истории.
+Записи, которые не удалось записать по другим причинам, повторяются не больше `LOGIN_HISTORY_MAX_ATTEMPTS` раз.
+"""
+
+import atexit
+import datetime
+import threading
+import typing as t
+import uuid
+from collections import deque
+
+from flask import Flask
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+
+from core import db
+from core.logger import auth_logger
+from models import LoginHistory
+
+from .user_agent_cache import user_agent_cache
+
+
+class LoginHistoryWriter:
+    """Буфер записей истории входов текущего воркера"""
+
+    def __init__(self):
+        self.app: t.Optional[Flask] = None
+        self.batch_size = 500
+        self.buffer_size = 10_000
+        self.flush_interval = 1.0
+        self.max_attempts = 5
+        self._buffer: deque[dict] = deque()
+        self._buffer_lock = threading.Lock()
+        # запись в бд выполняет один поток за раз, чтобы пачки не перемешивались
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+
+    def init_app(self, app: Flask) -> None:
+        """Настраивает буфер и запускает фоновую запись"""
+        if self.app is not None:
+            self.flush()  # записи предыдущего приложения пишем в его бд
+        self.app = app
+        self.batch_size = app.config.get("LOGIN_HISTORY_BATCH_SIZE", 500)
+        self.buffer_size = app.config.get("LOGIN_HISTORY_BUFFER_SIZE", 10_000)
+        self.flush_interval = app.config.get("LOGIN_HISTORY_FLUSH_INTERVAL", 1.0)
+        self.max_attempts = app.config.get("LOGIN_HISTORY_MAX_ATTEMPTS", 5)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="login-history-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def add(self, user_id: str, user_agent: str, ip: str, date: datetime.datetime) -> None:
+        """Добавляет запись о входе в буфер. Ошибки записи не должны ломать вход, поэтому наружу не выходят"""
+        record = dict(id=str(uuid.uuid4()), user_id=user_id, user_agent=user_agent, ip=ip, date=date)
+        with self._buffer_lock:
+            self._buffer.append(record)
+            size = len(self._buffer)
+        if size >= self.buffer_size:
+            # бд не успевает за входами, пишем сами, чтобы буфер не рос бесконечно
+            try:
+                self.flush()
+            except Exception as e:
+                auth_logger.error(f"Ошибка записи истории входов при входе\n{str(e)}")
+        elif size >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Пишет все накопленные записи в бд"""
+        with self._flush_lock:
+            with self._buffer_lock:
+                records = list(self._buffer)
+                self._buffer.clear()
+            if not records or self.app is None:
+                return
+            self._write(records)
+
+    def _write(self, records: list[dict]) -> None:
+        """Пишет пачку записей одним INSERT, не записанные записи возвращает в буфер или отбрасывает"""
+        try:
+            # flush выполняется и в запросе, поэтому пишем через своё соединение, не трогая сессию и контекст:
+            # db.session общая у запроса и его гринлета, а выход из app_context закрыл бы сессию запроса
+            engine = db.get_engine(self.app)
+            rows = self._make_rows(engine, records)
+            with engine.begin() as connection:
+                connection.execute(LoginHistory.__table__.insert(), rows)
+        except (IntegrityError, DataError) as e:
+            # бд отвергает запись из пачки, остальные записываем, делим пачку пока не найдём плохую запись
+            if len(records) > 1:
+                middle = len(records) // 2
+                self._write(records[:middle])
+                self._write(records[middle:])
+            else:
+                auth_logger.error(f"Запись истории входов отброшена, бд её не принимает: {records[0]}\n{str(e)}")
+        except SQLAlchemyError as e:
+            # бд недоступна, пачку запишем позже
+            self._requeue(records)
+            auth_logger.error(f"Ошибка при записи истории входов, записей {len(records)}\n{str(e)}")
+        except Exception as e:
+            self._requeue(self._count_attempt(records))
+            auth_logger.error(f"Ошибка при подготовке истории входов, записей {len(records)}\n{str(e)}")
+
+    def _count_attempt(self, records: list[dict]) -> list[dict]:
+        """Увеличивает счётчик неудачных попыток записей, записи исчерпавшие попытки отбрасываются"""
+        retry = []
+        for record in records:
+            record = dict(record, attempts=record.get("attempts", 0) + 1)
+            if record["attempts"] < self.max_attempts:
+                retry.append(record)
+            else:
+                auth_logger.error(f"Запись истории входов отброшена после {record['attempts']} попыток: {record}")
+        return retry
+
+    @staticmethod
+    def _make_rows(engine: Engine, records: list[dict]) -> list[dict]:
+        """Строки таблицы для записей буфера: User-Agent заменяется на id из справочника"""
+        user_agent_ids = user_agent_cache.get_ids(engine, (record["user_agent"] for record in records))
+        rows = []
+        for record in records:
+            row = dict(record)
+            row.pop("attempts", None)
+            row["user_agent_id"] = user_agent_ids[row.pop("user_agent")]
+            rows.append(row)
+        return rows
+
+    def _requeue(self, records: list[dict]) -> None:
+        """Возвращает не записанные записи в начало буфера, то что не помещается в буфер теряется"""
+        with self._buffer_lock:
+            free = max(self.buffer_size - len(self._buffer), 0)
+            if free < len(records):
+                auth_logger.error(f"Буфер истории входов переполнен, потеряно записей {len(records) - free}")
+            self._buffer.extendleft(reversed(records[:free]))
+
+    def _run(self) -> None:
+        """Цикл фоновой записи"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                auth_logger.error(f"Ошибка фоновой записи истории входов\n{str(e)}")
+
+
+login_history_writer = LoginHistoryWriter()
@@ -2,16 +2,19 @@ import typing as t
 from http import HTTPStatus
 
 import sqlalchemy.exc
-from flask import Response, abort, jsonify
+from flask import Response, abort, jsonify, request
 from injector import inject
 
 from core import db
 from core.logger import auth_logger
-from exceptions import DBMaintainException
+from exceptions import DBMaintainException, DBValidationException
 from models import Role, RoleSchema
+from utils import get_unique_violation
 
 import const_messages
 from .jwt_service import JWTService
+from .role_cache import role_cache
+from .user_cache import user_cache
 from .user_service import UserService
 
 
@@ -38,7 +41,7 @@ class RoleService:
         """Метод выполняет создание роли
         data - провалидированные данные полученные от пользователя
         """
-        # здесь при загрузке данных в схему, будет проведена проверка уникальности названия роли
+        # уникальность названия роли заранее не проверяем, это делает бд при вставке.
         # в случае если поле не уникально будет кинуты соответсвующее исключение и на клиент вернётся описание ошибки
         self.schema().load(data)
 
@@ -46,10 +49,13 @@ class RoleService:
         db.session.add(role)
         try:
             db.session.commit()
+        except sqlalchemy.exc.IntegrityError as e:
+            self._raise_name_exists(e, data)
         except sqlalchemy.exc.DatabaseError as e:
             auth_logger.error(f"Неожиданная ошибка в бд при сохранение роли пользователя {data}\n{str(e)}")
             raise DBMaintainException()
         else:
+            role_cache.invalidate()
             return self._make_response(role.dict())
 
     def delete_role(self, role_id: str) -> Response:
@@ -66,6 +72,9 @@ class RoleService:
             auth_logger.error(f"Неожиданная ошибка в бд при сохранение роли пользователя {role}\n{str(e)}")
             raise DBMaintainException()
         else:
+            role_cache.invalidate()
+            user_cache.invalidate()
+            self.token_service.bump_roles_version()
             return self._make_response(const_messages.ROLE_DELETED.format(role=role.name))
 
     def list_roles(self) -> Response:
@@ -88,10 +97,15 @@ class RoleService:
         db.session.add(role)
         try:
             db.session.commit()
+        except sqlalchemy.exc.IntegrityError as e:
+            self._raise_name_exists(e, data)
         except sqlalchemy.exc.DatabaseError as e:
             auth_logger.error(f"Неожиданная ошибка в бд при изменении роли\n{str(e)}")
             raise DBMaintainException()
         else:
+            role_cache.invalidate()
+            user_cache.invalidate()
+            self.token_service.bump_roles_version()
             return self._make_response(role.dict())
 
     def assign_role(self, data: dict) -> Response:
@@ -101,13 +115,17 @@ class RoleService:
         user = self._get_user(data)
         user.roles.append(role)
         db.session.add(user)
+        # после коммита поля объектов сбрасываются, поэтому всё нужное для ответа берём до него
+        user_id, message = user.id, const_messages.ROLE_ASSIGNED.format(role=role.name, user=user.username)
         try:
             db.session.commit()
         except sqlalchemy.exc.DatabaseError as e:
             auth_logger.error(f"Неожиданная ошибка в бд при добавлении роли\n{str(e)}")
             raise DBMaintainException()
         else:
-            return self._make_response(const_messages.ROLE_ASSIGNED.format(role=role.name, user=user.username))
+            user_cache.invalidate(user_id)
+            self.token_service.bump_roles_version(user_id)
+            return self._make_response(message)
 
     def unassign_role(self, data: dict) -> Response:
         """Метод убирает роль у пользователя в бд
@@ -116,17 +134,38 @@ class RoleService:
         user = self._get_user(data)
         user.roles.remove(role)
         db.session.add(user)
+        # после коммита поля объектов сбрасываются, поэтому всё нужное для ответа берём до него
+        user_id, message = user.id, const_messages.ROLE_UNASSIGNED.format(role=role.name, user=user.username)
         try:
             db.session.commit()
         except sqlalchemy.exc.DatabaseError as e:
             auth_logger.error(f"Неожиданная ошибка в бд при удалении роли у пользователя\n{str(e)}")
             raise DBMaintainException()
         else:
-            return self._make_response(const_messages.ROLE_UNASSIGNED.format(role=role.name, user=user.username))
+            user_cache.invalidate(user_id)
+            self.token_service.bump_roles_version(user_id)
+            return self._make_response(message)
+
+    def get_role_dictionary(self) -> Response:
+        """Метод возвращает текущий словарь ролей, версия словаря используется как ETag
+        """
+        dictionary = self.user_service.get_role_dictionary()
+        response = self._make_response(dictionary.dict())
+        response.set_etag(dictionary.version)
+        return response.make_conditional(request)
+
+    def _raise_name_exists(self, e: sqlalchemy.exc.IntegrityError, data: dict) -> t.NoReturn:
+        """Превращает нарушение уникальности названия роли в ошибку валидации, остальные ошибки в ошибку бд"""
+        db.session.rollback()
+        if get_unique_violation(e, self.model.__tablename__, ["name"]) is None:
+            auth_logger.error(f"Неожиданная ошибка в бд при сохранение роли {data}\n{str(e)}")
+            raise DBMaintainException()
+        auth_logger.debug(f"Ошибка сохранения роли. name {data.get('name')} уже занято")
+        raise DBValidationException(const_messages.EXC_ROLE_NAME_EXISTS)
 
     def _get_role(self, data):
-        """Получаем объекты роли"""
-        role = self.model.query.filter_by(name=data.get("role_name")).first()
+        """Получаем объекты роли, id роли по названию берём из кеша ролей"""
+        role = role_cache.get_role(data.get("role_name"))
         if not role:
             auth_logger.debug(f"При удалении роли у пользователя. Роль {data.get('role_name')} не найдена")
             abort(HTTPStatus.NOT_FOUND, description=const_messages.ROLE_NOT_FOUND.format(role=data.get("role_name")))
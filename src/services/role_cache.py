@@ -0,0 +1,120 @@
+"""
+Кеш ролей воркера.
+Ролей мало и меняются они редко, поэтому все роли держим в памяти процесса: соответствие названия и id роли
+и словарь ролей для компактной кодировки ролей в токене. Кеш загружается из бд при первом обращении в воркере.
+При создании, изменении и удалении роли кеш сбрасывается во всех воркерах через pub/sub,
+а TTL ограничивает время жизни кеша, если сообщение потерялось.
+"""
+
+import os
+import socket
+import threading
+import time
+import typing as t
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+
+from core import db
+from core.logger import auth_logger
+from core.pubsub import PubSub
+from models import Role
+from utils import RoleDictionary
+
+# канал сброса кеша, сообщение это отправитель сброса: свой сброс воркер уже сделал и повторно не выполняет
+ROLE_CACHE_CHANNEL = "role-cache-invalidation"
+
+
+class RoleSnapshot(t.NamedTuple):
+    """Загруженные из бд роли"""
+
+    ids: dict[str, str]  # название роли -> id
+    dictionary: RoleDictionary
+    expires_at: float
+
+
+class RoleCache:
+    """Кеш ролей текущего воркера"""
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.pubsub: t.Optional[PubSub] = None
+        self._snapshot: t.Optional[RoleSnapshot] = None
+        # номер сброса кеша, чтобы не сохранить роли загруженные до сброса
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_pubsub(self, pubsub: PubSub, ttl: float) -> None:
+        """Сбрасывает кеш и подписывается на сброс от других воркеров"""
+        self.ttl = ttl
+        self._clear()
+        if self.pubsub is None:
+            pubsub.subscribe(ROLE_CACHE_CHANNEL, self._on_invalidate)
+            pubsub.on_reconnect(self._clear)
+        self.pubsub = pubsub
+
+    def _get_snapshot(self) -> RoleSnapshot:
+        """Возвращает роли, при необходимости загружает их из бд"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            return snapshot
+
+        generation = self._generation
+        roles = Role.query.with_entities(Role.id, Role.name).order_by(Role.created_at, Role.id).all()
+        snapshot = RoleSnapshot(
+            ids={role.name: role.id for role in roles},
+            dictionary=RoleDictionary.from_roles(role.name for role in roles),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    def get_id(self, name: str) -> t.Optional[str]:
+        """Возвращает id роли по названию"""
+        return self._get_snapshot().ids.get(name)
+
+    def get_dictionary(self) -> RoleDictionary:
+        """Возвращает словарь ролей, роли в порядке создания"""
+        return self._get_snapshot().dictionary
+
+    def get_role(self, name: str) -> t.Optional[Role]:
+        """Возвращает роль по названию, присоединённую к текущей сессии, без запроса в бд.
+        Загружены только id и название, остальные поля загрузятся из бд при обращении к ним
+        """
+        role_id = self.get_id(name)
+        if role_id is None:
+            return None
+        role = Role(id=role_id, name=name)
+        make_transient_to_detached(role)
+        return db.session.merge(role, load=False)
+
+    def invalidate(self) -> None:
+        """Сбрасывает кеш во всех воркерах. Вызывается после изменения ролей в бд"""
+        self._clear()
+        if self.pubsub is None:
+            return
+        try:
+            self.pubsub.publish(ROLE_CACHE_CHANNEL, self._get_sender())
+        except RedisError as e:
+            # изменение в бд уже сделано, остальные воркеры увидят его по истечении TTL
+            auth_logger.error(f"Ошибка рассылки сброса кеша ролей\n{str(e)}")
+
+    @staticmethod
+    def _get_sender() -> str:
+        """Идентификатор воркера, pid берём в момент отправки, т.к кеш мог быть создан до fork"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _on_invalidate(self, sender: str) -> None:
+        """Обработчик сообщения о сбросе кеша"""
+        if sender != self._get_sender():
+            self._clear()
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+
+role_cache = RoleCache()
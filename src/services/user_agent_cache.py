@@ -0,0 +1,65 @@
+"""
+Кеш справочника User-Agent воркера.
+Запись справочника после создания не меняется, поэтому соответствие хеша строки и id кешируется надолго,
+и при записи истории входов справочник читается только для новых User-Agent.
+Новые строки добавляются в справочник с ON CONFLICT DO NOTHING: одну и ту же строку могут одновременно
+добавлять несколько воркеров.
+"""
+
+import typing as t
+
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from models import UserAgent
+from utils.ttl_cache import TTLCache
+
+# insert с поддержкой ON CONFLICT для используемых бд
+DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+USER_AGENT_CACHE_TTL = 24 * 60 * 60
+
+
+class UserAgentCache:
+    """Кеш id User-Agent по хешу строки"""
+
+    def __init__(self, maxsize: int = 10_000):
+        self._cache = TTLCache(maxsize=maxsize, ttl=USER_AGENT_CACHE_TTL)
+
+    def init_app(self, app: Flask) -> None:
+        """Настраивает размер кеша. id действительны только для бд своего приложения, поэтому кеш создаётся заново"""
+        self._cache = TTLCache(maxsize=app.config.get("USER_AGENT_CACHE_SIZE", 10_000), ttl=USER_AGENT_CACHE_TTL)
+
+    def get_ids(self, engine: Engine, values: t.Iterable[str]) -> dict[str, int]:
+        """Возвращает id справочника для строк User-Agent, отсутствующие в справочнике строки добавляет.
+        Новые строки добавляются в своей транзакции на отдельном соединении engine, а не в сессии запроса,
+        в кеш id попадают только после коммита этой транзакции
+        """
+        hashes = {value: UserAgent.make_hash(value) for value in set(values)}
+        ids = {}
+        for value, value_hash in hashes.items():
+            user_agent_id = self._cache.get(value_hash)
+            if user_agent_id is not None:
+                ids[value] = user_agent_id
+        missing = {value: value_hash for value, value_hash in hashes.items() if value not in ids}
+        if not missing:
+            return ids
+
+        table = UserAgent.__table__
+        with engine.begin() as connection:
+            connection.execute(
+                DIALECT_INSERTS[engine.dialect.name](table)
+                .values([dict(hash=value_hash, value=value) for value, value_hash in missing.items()])
+                .on_conflict_do_nothing(index_elements=["hash"])
+            )
+            found = dict(connection.execute(
+                select(table.c.hash, table.c.id).where(table.c.hash.in_(missing.values()))
+            ).all())
+        for value, value_hash in missing.items():
+            ids[value] = found[value_hash]
+            self._cache.set(value_hash, found[value_hash])
+        return ids
+
+
+user_agent_cache = UserAgentCache()
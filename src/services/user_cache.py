@@ -0,0 +1,88 @@
+"""
+Кеш пользователей для загрузки `current_user` по access токену.
+Без кеша каждый защищённый запрос делает запрос в бд за пользователем и его ролями.
+
+В кеше хранятся отсоединённые от сессии копии пользователей вместе с ролями. На запрос копия
+присоединяется к сессии через `merge(load=False)`, без обращения к бд, и дальше это обычный объект модели.
+Записи удаляются при смене пароля, назначении и снятии ролей, при изменении и удалении ролей.
+Удаление рассылается всем воркерам через pub/sub, а TTL ограничивает время жизни записи, если сообщение потерялось.
+"""
+
+import typing as t
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from core import db
+from core.logger import auth_logger
+from core.pubsub import PubSub
+from models import User
+from utils.ttl_cache import TTLCache
+
+# канал инвалидации кеша, сообщение это id пользователя или ALL_USERS
+USER_CACHE_CHANNEL = "user-cache-invalidation"
+ALL_USERS = "*"
+
+
+class UserCache:
+    """Кеш пользователей текущего воркера"""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.pubsub: t.Optional[PubSub] = None
+
+    def init_pubsub(self, pubsub: PubSub, maxsize: int, ttl: float) -> None:
+        """Настраивает размер кеша и подписывается на инвалидацию от других воркеров"""
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        if self.pubsub is None:
+            pubsub.subscribe(USER_CACHE_CHANNEL, self._on_invalidate)
+            # пока не были подписаны, сообщения об изменениях могли потеряться
+            pubsub.on_reconnect(self._cache_clear)
+        self.pubsub = pubsub
+
+    def get(self, user_id: str) -> t.Optional[User]:
+        """Возвращает пользователя из кеша, присоединённого к текущей сессии"""
+        user = self._cache.get(user_id)
+        if user is None:
+            return None
+        return db.session.merge(user, load=False)
+
+    def set(self, user: User) -> None:
+        """Кладёт в кеш копию пользователя с ролями.
+        Копия собирается во временной сессии без обращения к бд и не связана с сессией запроса,
+        поэтому коммиты в запросе не делают её устаревшей(expire)
+        """
+        user.get_roles()  # роли должны быть загружены до копирования
+        session = Session()
+        try:
+            snapshot = session.merge(user, load=False)
+            session.expunge_all()
+        finally:
+            session.close()
+        self._cache.set(user.id, snapshot)
+
+    def invalidate(self, user_id: str = ALL_USERS) -> None:
+        """Удаляет пользователя из кеша во всех воркерах, по умолчанию очищает кеш целиком.
+        В своём воркере запись удаляем сразу, не дожидаясь сообщения из redis
+        """
+        self._on_invalidate(user_id)
+        if self.pubsub is None:
+            return
+        try:
+            self.pubsub.publish(USER_CACHE_CHANNEL, user_id)
+        except RedisError as e:
+            # изменение в бд уже сделано, остальные воркеры увидят его по истечении TTL
+            auth_logger.error(f"Ошибка рассылки инвалидации кеша пользователей {user_id}\n{str(e)}")
+
+    def _on_invalidate(self, user_id: str) -> None:
+        """Обработчик сообщения об инвалидации"""
+        if user_id == ALL_USERS:
+            self._cache_clear()
+        else:
+            self._cache.pop(user_id)
+
+    def _cache_clear(self) -> None:
+        self._cache.clear()
+
+
+user_cache = UserCache()
@@ -1,11 +1,18 @@
 from functools import wraps
 
 import sqlalchemy.exc
+from sqlalchemy.orm import Query, joinedload
 
 from core import db
 from core.logger import auth_logger
-from exceptions import DBMaintainException
-from models import User, UserSchema
+from exceptions import DBMaintainException, DBValidationException
+from models import Role, User, UserSchema
+from models.user import user_role
+from utils import RoleDictionary, get_unique_violation
+
+import const_messages
+from .role_cache import role_cache
+from .user_cache import user_cache
 
 
 def sql_error_handler(f):
@@ -28,10 +35,12 @@ class UserService:
     """
     model = User
     schema = UserSchema
+    # уникальные поля пользователя и сообщения об ошибке, если значение уже занято
+    unique_fields = {"username": const_messages.EXC_USERNAME_EXISTS, "email": const_messages.EXC_EMAIL_EXISTS}
 
     def create_user(self, data: dict) -> User:
         """Создание пользователя в БД - регистрация"""
-        # здесь при загрузке данных в схему, будет проведена проверка уникальности username и email
+        # уникальность username и email заранее не проверяем, это делает бд при вставке одним запросом.
         # в случае если поле не уникально будет кинуты соответсвующее исключение и на клиент вернётся описание ошибки
         self.schema().load(data)
 
@@ -44,6 +53,14 @@ class UserService:
         db.session.add(user)
         try:
             db.session.commit()
+        except sqlalchemy.exc.IntegrityError as e:
+            db.session.rollback()
+            column = get_unique_violation(e, self.model.__tablename__, self.unique_fields)
+            if column is None:
+                auth_logger.error(f"Неожиданная ошибка в бд при сохранение пользователя\n{str(e)}")
+                raise DBMaintainException()
+            auth_logger.debug(f"Ошибка регистрации пользователя. {column} {data.get(column)} уже занято")
+            raise DBValidationException(self.unique_fields[column])
         except sqlalchemy.exc.DatabaseError as e:
             """В случае ошибки создания записи в бд"""
             auth_logger.error(f"Неожиданная ошибка в бд при сохранение пользователя\n{str(e)}")
@@ -57,24 +74,26 @@ class UserService:
         user.password = password
         db.session.add(user)
         db.session.commit()
+        user_cache.invalidate(user.id)
 
     @sql_error_handler
     def get_all(self):
         users = User.query.all()
         return users
 
-    def is_username_registered(self, value):
-        """Проверка на существующий `username`"""
-        return bool(self.get_by_username(value))
-
-    def is_email_registered(self, value):
-        """Проверка на существующий `email`"""
-        return bool(self.get_by_email(value))
+    def _query(self, with_roles: bool = True) -> Query:
+        """Запрос пользователей. with_roles - роли загружаются тем же запросом(JOIN),
+        иначе при первом обращении к `roles` будет выполнен ещё один запрос в бд
+        """
+        query = self.model.query
+        if with_roles:
+            query = query.options(joinedload(self.model.roles))
+        return query
 
     @sql_error_handler
-    def get_by_username(self, value):
+    def get_by_username(self, value, with_roles: bool = True):
         """Поиск пользователя по `username`"""
-        return self.model.query.filter_by(username=value).first()
+        return self._query(with_roles).filter_by(username=value).first()
 
     @sql_error_handler
     def get_by_email(self, value):
@@ -82,12 +101,32 @@ class UserService:
         return self.model.query.filter_by(email=value).first()
 
     @sql_error_handler
-    def get_by_id(self, value):
+    def get_by_id(self, value, with_roles: bool = True):
         """Поиск пользователя по `id`"""
-        return self.model.query.filter_by(id=str(value)).first()
+        return self._query(with_roles).filter_by(id=str(value)).first()
+
+    def get_by_id_cached(self, value):
+        """Поиск пользователя по `id` через кеш пользователей воркера"""
+        user = user_cache.get(str(value))
+        if user is None:
+            user = self.get_by_id(value)
+            if user:
+                user_cache.set(user)
+        return user
 
     @sql_error_handler
     def get_user_roles(self, user_id: str):
         """Поиск пользователя по `id`"""
-        user = self.model.query.filter_by(id=user_id).first()
+        user = self._query().filter_by(id=user_id).first()
         return user.get_roles() if user else []
+
+    @sql_error_handler
+    def get_role_names(self, user_id: str) -> list[str]:
+        """Названия ролей пользователя, одним запросом и без загрузки модели пользователя"""
+        query = db.session.query(Role.name).join(user_role, user_role.c.role_id == Role.id)
+        return [name for name, in query.filter(user_role.c.user_id == str(user_id)).all()]
+
+    @sql_error_handler
+    def get_role_dictionary(self) -> RoleDictionary:
+        """Словарь ролей для компактной кодировки ролей в токене, роли в порядке создания"""
+        return role_cache.get_dictionary()
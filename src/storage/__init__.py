@@ -1,2 +1,5 @@
+from .jwt_memory_storage import JWTMemoryStorage  # noqa
+from .jwt_redis_cluster_storage import JWTRedisClusterStorage  # noqa
+from .jwt_redis_compact_storage import JWTRedisCompactStorage  # noqa
 from .jwt_redis_storage import JWTRedisStorage  # noqa
-from .jwt_storage import JWTStorage  # noqa
+from .jwt_storage import JWTStorage, TokenInfo  # noqa
@@ -0,0 +1,128 @@
+"""
+Хранилище токенов в памяти процесса.
+Подходит для запуска в один процесс, тестов и бенчмарков, когда redis не нужен или мешает своими сетевыми задержками.
+Данные не разделяются между воркерами gunicorn и теряются при перезапуске.
+"""
+
+import heapq
+import threading
+import time
+import typing as t
+
+from .jwt_storage import JWTStorage, TokenInfo
+
+
+class JWTMemoryStorage(JWTStorage):
+    """Реализация хранилища токенов в памяти.
+    Токены пользователя хранятся в словаре jti -> exp, у каждого пользователя свой словарь.
+    Просроченные записи удаляются по мин-куче сроков истечения: на каждой операции снимаем с вершины кучи всё,
+    что уже "протухло". Удалённые раньше срока записи остаются в куче и пропускаются при снятии.
+    Все операции выполняются под блокировкой, под gevent она кооперативная.
+    """
+
+    def __init__(self):
+        self._user_tokens: dict[str, dict[str, int]] = {}
+        self._revoked_access_tokens: dict[str, int] = {}
+        # счётчики изменений ролей: общий и по пользователям
+        self._roles_version = 0
+        self._user_roles_versions: dict[str, int] = {}
+        # элементы кучи: (exp, user_id, jti), для отозванных access токенов user_id пустая строка
+        self._expiry_heap: list[tuple[int, str, str]] = []
+        self._lock = threading.RLock()
+
+    def _remove_expired(self) -> None:
+        """Удаляет все записи срок действия которых истёк. Вызывается под блокировкой"""
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            token_exp, user_id, jti = heapq.heappop(self._expiry_heap)
+            if not user_id:
+                if self._revoked_access_tokens.get(jti) == token_exp:
+                    del self._revoked_access_tokens[jti]
+                continue
+            tokens = self._user_tokens.get(user_id)
+            if tokens is not None and tokens.get(jti) == token_exp:
+                del tokens[jti]
+                if not tokens:
+                    del self._user_tokens[user_id]
+
+    def _add_token(self, token: TokenInfo, user_id: str) -> None:
+        """Добавляет токен пользователя. Вызывается под блокировкой"""
+        self._user_tokens.setdefault(user_id, {})[token.jti] = token.exp
+        heapq.heappush(self._expiry_heap, (token.exp, user_id, token.jti))
+
+    def save_token(self, token: TokenInfo, user_id: str) -> None:
+        """Сохраняем jti токена"""
+        user_id = str(user_id)
+        with self._lock:
+            self._remove_expired()
+            self._add_token(token, user_id)
+
+    def get_token_by_jti(self, token_jti: str, user_id: str) -> t.Optional[str]:
+        """Возвращает токен, конкретно его jti"""
+        with self._lock:
+            self._remove_expired()
+            return token_jti if token_jti in self._user_tokens.get(str(user_id), {}) else None
+
+    def remove_token_by_jti(self, token_jti: str, user_id: str) -> None:
+        """Удаляет токен"""
+        user_id = str(user_id)
+        with self._lock:
+            tokens = self._user_tokens.get(user_id, {})
+            tokens.pop(token_jti, None)
+            if not tokens:
+                self._user_tokens.pop(user_id, None)
+
+    def rotate_token(self, old_jti: str, new_token: TokenInfo, user_id: str) -> bool:
+        """Атомарно заменяет refresh токен на новый"""
+        user_id = str(user_id)
+        with self._lock:
+            self._remove_expired()
+            tokens = self._user_tokens.get(user_id, {})
+            if tokens.pop(old_jti, None) is None:
+                return False
+            self._add_token(new_token, user_id)
+            return True
+
+    def remove_all_user_tokens(self, user_id: str) -> None:
+        """Удаляем все токены пользователя"""
+        with self._lock:
+            self._user_tokens.pop(str(user_id), None)
+
+    def count_user_tokens(self, user_id: str) -> int:
+        """Возвращает количество действующих токенов пользователя"""
+        with self._lock:
+            self._remove_expired()
+            return len(self._user_tokens.get(str(user_id), {}))
+
+    def get_user_tokens(self, user_id: str) -> list[str]:
+        """Возвращает список jti действующих токенов пользователя"""
+        with self._lock:
+            self._remove_expired()
+            return list(self._user_tokens.get(str(user_id), {}))
+
+    def revoke_access_token(self, token_jti: str, token_exp: int) -> None:
+        """Добавляет access токен в список отозванных"""
+        with self._lock:
+            self._remove_expired()
+            self._revoked_access_tokens[token_jti] = token_exp
+            heapq.heappush(self._expiry_heap, (token_exp, "", token_jti))
+
+    def is_access_token_revoked(self, token_jti: str) -> bool:
+        """Проверяет отозван ли access токен"""
+        with self._lock:
+            self._remove_expired()
+            return token_jti in self._revoked_access_tokens
+
+    def get_roles_version(self, user_id: str) -> str:
+        """Возвращает версию ролей пользователя"""
+        with self._lock:
+            return f"{self._roles_version}.{self._user_roles_versions.get(str(user_id), 0)}"
+
+    def bump_roles_version(self, user_id: t.Optional[str] = None) -> None:
+        """Увеличивает счётчик изменений ролей пользователя, без user_id - общий счётчик"""
+        with self._lock:
+            if user_id is None:
+                self._roles_version += 1
+            else:
+                user_id = str(user_id)
+                self._user_roles_versions[user_id] = self._user_roles_versions.get(user_id, 0) + 1
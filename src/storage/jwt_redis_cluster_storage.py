@@ -0,0 +1,48 @@
+"""
+Хранилище токенов в Redis Cluster.
+Все ключи пользователя содержат hash tag `{user_id}`, поэтому попадают в один слот кластера.
+Благодаря этому операции над токенами одного пользователя(в т.ч Lua скрипт ротации) выполняются на одном шарде,
+а сами пользователи распределяются по шардам кластера.
+"""
+
+from redis.client import Pipeline
+
+from .jwt_redis_storage import (REVOKED_ACCESS_TOKENS_CHANNEL,
+                                REVOKED_ACCESS_TOKENS_KEY, JWTRedisStorage,
+                                redis_error_wrapper)
+
+
+class JWTRedisClusterStorage(JWTRedisStorage):
+    """Реализация хранилища токенов на основе Redis Cluster.
+    Работает через клиент `rediscluster.RedisCluster`. Транзакции MULTI/EXEC кластерный клиент не поддерживает,
+    поэтому команды pipeline(сохранение и удаление токена) отправляются без транзакции, но на один узел.
+    Ротация refresh токена остаётся атомарной, т.к выполняется Lua скриптом.
+    """
+
+    @staticmethod
+    def _get_name(user_id: str, token_jti: str) -> str:
+        """Формирует и возвращает имя под которым будет сохранён токен"""
+        return f"{{{user_id}}}-{token_jti}"
+
+    @staticmethod
+    def _get_index_name(user_id: str) -> str:
+        """Формирует и возвращает имя индекса токенов пользователя"""
+        return f"{{{user_id}}}-sessions"
+
+    @staticmethod
+    def _get_roles_version_name(user_id: str) -> str:
+        """Формирует и возвращает имя счётчика изменений ролей пользователя"""
+        return f"{{{user_id}}}-roles-version"
+
+    def _pipeline(self) -> Pipeline:
+        """Возвращает pipeline без транзакции"""
+        return self.redis.pipeline(transaction=False)
+
+    @redis_error_wrapper
+    def revoke_access_token(self, token_jti: str, token_exp: int) -> None:
+        """Добавляет access токен в список отозванных и оповещает об этом остальные воркеры.
+        pipeline кластерного клиента не поддерживает publish, поэтому команды отправляются по отдельности
+        """
+        self.redis.zadd(REVOKED_ACCESS_TOKENS_KEY, {token_jti: token_exp})
+        self.redis.publish(REVOKED_ACCESS_TOKENS_CHANNEL, token_jti)
+        self._add_to_revoked_filter(token_jti)
@@ -0,0 +1,214 @@
+"""
+Компактное хранение refresh токенов в redis.
+Вместо ключа `{user_id}-{jti}` со значением jti на каждый токен и отдельного индекса, у пользователя есть только
+один sorted set. Ключ это префикс и 16 байт uuid пользователя, member это 16 байт jti, score это exp токена.
+Небольшие sorted set'ы redis хранит в компактной кодировке(ziplist/listpack), так что сессия занимает
+несколько десятков байт вместо сотен.
+"""
+
+import time
+import typing as t
+import uuid
+
+from redis import Redis
+
+from .jwt_redis_storage import JWTRedisStorage, redis_error_wrapper
+from .jwt_storage import TokenInfo
+
+COMPACT_KEY_PREFIX = b"rt:"
+LEGACY_INDEX_SUFFIX = "-sessions"
+
+# Lua скрипт сохранения токена: добавляем jti в sorted set пользователя, вычищаем просроченные
+# и продлеваем время жизни ключа, если новый токен живёт дольше.
+# KEYS: sorted set пользователя
+# ARGV: jti, exp, ttl, текущее время
+SAVE_TOKEN_SCRIPT = """
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[4])
+if redis.call("TTL", KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call("EXPIRE", KEYS[1], ARGV[3])
+end
+return 1
+"""
+
+# Lua скрипт ротации токена. Старый токен ищем сначала в компактном формате, потом в старом(до миграции).
+# KEYS: sorted set пользователя, старый ключ токена, старый индекс пользователя
+# ARGV: jti старого токена, jti нового токена, exp нового токена, ttl нового токена, текущее время,
+#       jti старого токена строкой
+ROTATE_TOKEN_SCRIPT = """
+local old_exp = redis.call("ZSCORE", KEYS[1], ARGV[1])
+if old_exp and tonumber(old_exp) > tonumber(ARGV[5]) then
+    redis.call("ZREM", KEYS[1], ARGV[1])
+elseif redis.call("DEL", KEYS[2]) == 1 then
+    redis.call("ZREM", KEYS[3], ARGV[6])
+else
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[3], ARGV[2])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[5])
+if redis.call("TTL", KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call("EXPIRE", KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+# Lua скрипт переноса токена из старого формата в компактный. Токен переносится атомарно: если его успели
+# отозвать или ротировать, то ключа уже нет и токен не переносится, поэтому отозванный токен не оживёт.
+# Ключи без срока жизни не переносим.
+# KEYS: sorted set пользователя, старый ключ токена
+# ARGV: jti токена, текущее время
+MIGRATE_TOKEN_SCRIPT = """
+local pttl = redis.call("PTTL", KEYS[2])
+if pttl <= 0 then
+    return 0
+end
+local ttl = math.max(math.floor(pttl / 1000), 1)
+redis.call("ZADD", KEYS[1], math.floor(tonumber(ARGV[2]) + pttl / 1000), ARGV[1])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[2])
+if redis.call("TTL", KEYS[1]) < ttl then
+    redis.call("EXPIRE", KEYS[1], ttl)
+end
+redis.call("DEL", KEYS[2])
+return 1
+"""
+
+
+def _to_bytes(value: str) -> bytes:
+    """uuid в виде 16 байт, любые другие идентификаторы как есть"""
+    try:
+        return uuid.UUID(str(value)).bytes
+    except ValueError:
+        return str(value).encode()
+
+
+def _from_bytes(value: bytes) -> str:
+    """Обратное преобразование для `_to_bytes`"""
+    return str(uuid.UUID(bytes=value)) if len(value) == 16 else value.decode()
+
+
+class JWTRedisCompactStorage(JWTRedisStorage):
+    """Реализация хранилища токенов на основе `redis` в компактной кодировке.
+    Для бинарных ключей нужен клиент без декодирования ответов - `binary_redis`.
+    Отозванные access токены хранятся так же как в `JWTRedisStorage` через обычный клиент.
+
+    Миграция с обычного формата: токены в старом формате продолжают приниматься при рефреше и переносятся
+    в компактный формат при ротации, а `migrate_legacy_tokens` переносит все оставшиеся токены разом.
+    """
+
+    def __init__(self, redis: Redis, binary_redis: Redis, **kwargs):
+        super().__init__(redis, **kwargs)
+        self.binary_redis = binary_redis
+        self._save_token_script = self.binary_redis.register_script(SAVE_TOKEN_SCRIPT)
+        self._rotate_compact_token_script = self.binary_redis.register_script(ROTATE_TOKEN_SCRIPT)
+        self._migrate_token_script = self.binary_redis.register_script(MIGRATE_TOKEN_SCRIPT)
+
+    @staticmethod
+    def _get_compact_name(user_id: str) -> bytes:
+        """Формирует и возвращает имя sorted set'а токенов пользователя"""
+        return COMPACT_KEY_PREFIX + _to_bytes(user_id)
+
+    def _save_compact_token(self, user_id: str, token_jti: str, token_exp: float, client=None) -> None:
+        """Сохраняем токен в компактном формате, client позволяет выполнить скрипт в pipeline"""
+        ttl = max(int(token_exp - time.time()), 1)
+        self._save_token_script(
+            keys=[self._get_compact_name(user_id)], args=[_to_bytes(token_jti), token_exp, ttl, time.time()],
+            client=client,
+        )
+
+    @redis_error_wrapper
+    def save_token(self, token: TokenInfo, user_id: str) -> None:
+        """Сохраняем jti токена в sorted set пользователя одним вызовом скрипта"""
+        self._save_compact_token(user_id, token.jti, token.exp)
+
+    @redis_error_wrapper
+    def get_token_by_jti(self, token_jti: str, user_id: str) -> t.Optional[str]:
+        """Возвращает jti токена если он действителен. Токен ищем в обоих форматах за один запрос"""
+        pipe = self.binary_redis.pipeline(transaction=False)
+        pipe.zscore(self._get_compact_name(user_id), _to_bytes(token_jti))
+        pipe.exists(self._get_name(user_id, token_jti))
+        token_exp, is_legacy_exists = pipe.execute()
+        if (token_exp is not None and token_exp > time.time()) or is_legacy_exists:
+            return token_jti
+        return None
+
+    @redis_error_wrapper
+    def remove_token_by_jti(self, token_jti: str, user_id: str) -> None:
+        """Удаляет токен в обоих форматах"""
+        pipe = self.binary_redis.pipeline()
+        pipe.zrem(self._get_compact_name(user_id), _to_bytes(token_jti))
+        pipe.delete(self._get_name(user_id, token_jti))
+        pipe.zrem(self._get_index_name(user_id), token_jti)
+        pipe.execute()
+
+    @redis_error_wrapper
+    def rotate_token(self, old_jti: str, new_token: TokenInfo, user_id: str) -> bool:
+        """Атомарно заменяет refresh токен на новый. Токен в старом формате при этом переезжает в компактный"""
+        ttl = max(int(new_token.exp - time.time()), 1)
+        keys = [self._get_compact_name(user_id), self._get_name(user_id, old_jti), self._get_index_name(user_id)]
+        args = [_to_bytes(old_jti), _to_bytes(new_token.jti), new_token.exp, ttl, time.time(), old_jti]
+        return bool(self._rotate_compact_token_script(keys=keys, args=args))
+
+    @redis_error_wrapper
+    def remove_all_user_tokens(self, user_id: str) -> None:
+        """Удаляем все токены пользователя в обоих форматах"""
+        super().remove_all_user_tokens(user_id)
+        self.binary_redis.delete(self._get_compact_name(user_id))
+
+    @redis_error_wrapper
+    def count_user_tokens(self, user_id: str) -> int:
+        """Возвращает количество действующих токенов пользователя"""
+        return self.binary_redis.zcount(self._get_compact_name(user_id), time.time(), "+inf") + \
+            super().count_user_tokens(user_id)
+
+    @redis_error_wrapper
+    def get_user_tokens(self, user_id: str) -> list[str]:
+        """Возвращает список jti действующих токенов пользователя"""
+        jtis = self.binary_redis.zrangebyscore(self._get_compact_name(user_id), time.time(), "+inf")
+        return [_from_bytes(jti) for jti in jtis] + super().get_user_tokens(user_id)
+
+    @redis_error_wrapper
+    def migrate_legacy_tokens(self, batch_size: int = 1000) -> int:
+        """Переносит токены из старого формата `{user_id}-{jti}` в компактный и удаляет старые индексы.
+        Ключи ищем через SCAN, обрабатываем пачками по batch_size, возвращает количество перенесённых токенов.
+        Индексы удаляются вторым проходом, когда все токены уже перенесены: пока токен пользователя
+        в старом формате, по индексу его находит выход со всех устройств
+        """
+        migrated = 0
+        batch: list[str] = []
+        for key in self.redis.scan_iter(match="*-*", count=batch_size):
+            if key.endswith(LEGACY_INDEX_SUFFIX):
+                continue
+            user_id, token_jti = key[:36], key[37:]
+            if not (self._is_uuid(user_id) and self._is_uuid(token_jti)):
+                continue
+            batch.append(key)
+            if len(batch) >= batch_size:
+                migrated += self._migrate_legacy_batch(batch)
+                batch = []
+        if batch:
+            migrated += self._migrate_legacy_batch(batch)
+        for key in self.redis.scan_iter(match=f"*{LEGACY_INDEX_SUFFIX}", count=batch_size):
+            if self._is_uuid(key[:-len(LEGACY_INDEX_SUFFIX)]):
+                self.redis.delete(key)
+        return migrated
+
+    @staticmethod
+    def _is_uuid(value: str) -> bool:
+        """Проверяет что строка это uuid, uuid должен быть записан полностью, 36 символов"""
+        if len(value) != 36:
+            return False
+        try:
+            uuid.UUID(value)
+        except ValueError:
+            return False
+        return True
+
+    def _migrate_legacy_batch(self, keys: list[str]) -> int:
+        """Переносит пачку токенов, каждый токен своим вызовом скрипта, все вызовы уходят одним pipeline"""
+        now = time.time()
+        pipe = self.binary_redis.pipeline(transaction=False)
+        for key in keys:
+            self._migrate_token_script(
+                keys=[self._get_compact_name(key[:36]), key], args=[_to_bytes(key[37:]), now], client=pipe
+            )
+        return sum(pipe.execute())
@@ -6,16 +6,44 @@
 """
 
 import datetime
+import threading
+import time
+import typing as t
 from functools import wraps
 
-from flask_jwt_extended import decode_token, get_jti
 from redis import Redis
+from redis.client import Pipeline
 from redis.exceptions import RedisError
 
 from core.logger import auth_logger
+from core.pubsub import PubSub
 from exceptions import DBMaintainException
+from utils import BloomFilter
 
-from .jwt_storage import JWTStorage
+from .jwt_storage import JWTStorage, TokenInfo
+
+# sorted set отозванных access токенов: member это jti, score это exp токена
+REVOKED_ACCESS_TOKENS_KEY = "revoked-access-tokens"
+# канал через который воркеры узнают об отозванных access токенах
+REVOKED_ACCESS_TOKENS_CHANNEL = "revoked-access-tokens"
+# счётчик изменений, затрагивающих роли всех пользователей(изменение и удаление ролей)
+ROLES_VERSION_KEY = "roles-version"
+
+# Lua скрипт для ротации refresh токена. Выполняется в редисе атомарно, за один запрос:
+# если старый токен есть - удаляем его, сохраняем новый и обновляем индекс токенов пользователя.
+# KEYS: старый токен, новый токен, индекс пользователя
+# ARGV: jti старого токена, jti нового токена, exp нового токена, ttl нового токена, текущее время
+ROTATE_TOKEN_SCRIPT = """
+if redis.call("DEL", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("ZREM", KEYS[3], ARGV[1])
+redis.call("SET", KEYS[2], ARGV[2], "EX", ARGV[4])
+redis.call("ZADD", KEYS[3], ARGV[3], ARGV[2])
+redis.call("ZREMRANGEBYSCORE", KEYS[3], "-inf", ARGV[5])
+redis.call("EXPIRE", KEYS[3], ARGV[4])
+return 1
+"""
 
 
 def redis_error_wrapper(f):
@@ -34,35 +62,87 @@ def redis_error_wrapper(f):
 
 
 class JWTRedisStorage(JWTStorage):
-    """Реализация хранилища токенов на основе `redis`"""
+    """Реализация хранилища токенов на основе `redis`
+
+    Помимо ключа на каждый токен, для каждого пользователя ведётся индекс - sorted set,
+    где member это jti токена, а score это время(timestamp) когда токен "протухнет".
+    Индекс позволяет удалить все токены пользователя и посчитать его активные сессии за пару запросов к редису,
+    не обходя всё пространство ключей. Просроченные записи из индекса вычищаются лениво, при записи нового токена.
+
+    Отозванные access токены хранятся в одном sorted set(jti -> exp). Перед ним в каждом воркере стоит фильтр Блума,
+    поэтому обычный случай "токен не отозван" проверяется локально без запроса в редис. Фильтры воркеров
+    пополняются через pub/sub и периодически пересобираются из redis, чтобы забыть просроченные токены.
+    """
 
-    def __init__(self, redis: Redis):
+    def __init__(
+        self,
+        redis: Redis,
+        pubsub: t.Optional[PubSub] = None,
+        revoked_filter_capacity: int = 100_000,
+        revoked_filter_error_rate: float = 0.01,
+        revoked_filter_rebuild_interval: int = 15 * 60,
+    ):
         self.redis = redis
+        self._rotate_token_script = self.redis.register_script(ROTATE_TOKEN_SCRIPT)
+
+        self._revoked_filter_capacity = revoked_filter_capacity
+        self._revoked_filter_error_rate = revoked_filter_error_rate
+        self._revoked_filter_rebuild_interval = revoked_filter_rebuild_interval
+        self._revoked_filter = self._new_revoked_filter()
+        # фильтр который сейчас пересобирается, новые jti пишем и в него, чтобы не потерять их при подмене
+        self._next_revoked_filter: t.Optional[BloomFilter] = None
+        self._revoked_filter_rebuild_at = 0.0
+        self._revoked_filter_lock = threading.Lock()
+        if pubsub is not None:
+            pubsub.subscribe(REVOKED_ACCESS_TOKENS_CHANNEL, self._add_to_revoked_filter)
+            pubsub.on_reconnect(self._schedule_revoked_filter_rebuild)
 
     @staticmethod
     def _get_name(user_id: str, token_jti: str) -> str:
         """Формирует и возвращает имя под которым будет сохранён токен"""
         return f"{user_id}-{token_jti}"
 
-    @redis_error_wrapper
-    def _get_ttl(self, token: str) -> datetime.timedelta:
+    @staticmethod
+    def _get_index_name(user_id: str) -> str:
+        """Формирует и возвращает имя индекса токенов пользователя"""
+        return f"{user_id}-sessions"
+
+    @staticmethod
+    def _get_roles_version_name(user_id: str) -> str:
+        """Формирует и возвращает имя счётчика изменений ролей пользователя"""
+        return f"{user_id}-roles-version"
+
+    def _pipeline(self) -> Pipeline:
+        """Возвращает pipeline, команды которого уходят в редис одной транзакцией"""
+        return self.redis.pipeline()
+
+    @staticmethod
+    def _get_ttl(token_exp: int) -> datetime.timedelta:
         """Метод вычисляет с каким ttl сохранить токен в редисе.
         ttl будет равен количеству оставшихся секунд до момента когда токен "протухнет".
         Таким образом исключим хранение в бд просроченных токенов.
         """
-        token_exp = decode_token(token).get("exp")
         ttl = datetime.datetime.fromtimestamp(token_exp) - datetime.datetime.now()
         return ttl
 
     @redis_error_wrapper
-    def save_token(self, token: str, user_id: str) -> None:
-        """Сохраняем jti токена в редис.
+    def save_token(self, token: TokenInfo, user_id: str) -> None:
+        """Сохраняем jti токена в редис и добавляем его в индекс токенов пользователя.
+        Все команды уходят в редис одной транзакцией.
         """
-        jti = get_jti(token)
+        jti, token_exp = token.jti, token.exp
         key = self._get_name(user_id, jti)
-        value = jti
-        ttl = self._get_ttl(token)
-        self.redis.set(key, value, ex=ttl)
+        index = self._get_index_name(user_id)
+        ttl = self._get_ttl(token_exp)
+
+        pipe = self._pipeline()
+        pipe.set(key, jti, ex=ttl)
+        pipe.zadd(index, {jti: token_exp})
+        # заодно вычищаем из индекса уже просроченные токены
+        pipe.zremrangebyscore(index, "-inf", time.time())
+        # индекс живёт столько же сколько самый "свежий" токен пользователя
+        pipe.expire(index, ttl)
+        pipe.execute()
 
     @redis_error_wrapper
     def get_token_by_jti(self, token_jti: str, user_id: str) -> str:
@@ -71,10 +151,106 @@ class JWTRedisStorage(JWTStorage):
 
     @redis_error_wrapper
     def remove_token_by_jti(self, token_jti: str, user_id: str) -> None:
-        """Удаляет токен из бд"""
-        self.redis.delete(self._get_name(user_id, token_jti))
+        """Удаляет токен из бд и из индекса токенов пользователя"""
+        pipe = self._pipeline()
+        pipe.delete(self._get_name(user_id, token_jti))
+        pipe.zrem(self._get_index_name(user_id), token_jti)
+        pipe.execute()
+
+    @redis_error_wrapper
+    def rotate_token(self, old_jti: str, new_token: TokenInfo, user_id: str) -> bool:
+        """Атомарно заменяет refresh токен на новый. Проверка, удаление старого и запись нового токена
+        выполняются в редисе одним Lua скриптом, поэтому два одновременных рефреша по одному токену
+        не смогут оба получить новые токены.
+        """
+        new_jti, token_exp = new_token.jti, new_token.exp
+        ttl = max(int(self._get_ttl(token_exp).total_seconds()), 1)
+        keys = [self._get_name(user_id, old_jti), self._get_name(user_id, new_jti), self._get_index_name(user_id)]
+        args = [old_jti, new_jti, token_exp, ttl, time.time()]
+        return bool(self._rotate_token_script(keys=keys, args=args))
 
     @redis_error_wrapper
     def remove_all_user_tokens(self, user_id: str) -> None:
-        """Удаляем все токены пользователя"""
-        self.redis.delete(self._get_name(user_id, "*"))
+        """Удаляем все токены пользователя.
+        Берём jti токенов из индекса и одной командой удаляем и токены и сам индекс.
+        """
+        index = self._get_index_name(user_id)
+        jtis = self.redis.zrange(index, 0, -1)
+        self.redis.delete(index, *(self._get_name(user_id, jti) for jti in jtis))
+
+    @redis_error_wrapper
+    def count_user_tokens(self, user_id: str) -> int:
+        """Возвращает количество действующих токенов пользователя"""
+        return self.redis.zcount(self._get_index_name(user_id), time.time(), "+inf")
+
+    @redis_error_wrapper
+    def get_user_tokens(self, user_id: str) -> list[str]:
+        """Возвращает список jti действующих токенов пользователя"""
+        return self.redis.zrangebyscore(self._get_index_name(user_id), time.time(), "+inf")
+
+    @redis_error_wrapper
+    def get_roles_version(self, user_id: str) -> str:
+        """Версия ролей это пара счётчиков: общий для всех пользователей и счётчик пользователя"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(ROLES_VERSION_KEY)
+        pipe.get(self._get_roles_version_name(user_id))
+        common_version, user_version = pipe.execute()
+        return f"{common_version or 0}.{user_version or 0}"
+
+    @redis_error_wrapper
+    def bump_roles_version(self, user_id: t.Optional[str] = None) -> None:
+        """Увеличивает счётчик изменений ролей пользователя, без user_id - общий счётчик"""
+        self.redis.incr(ROLES_VERSION_KEY if user_id is None else self._get_roles_version_name(user_id))
+
+    def _new_revoked_filter(self) -> BloomFilter:
+        return BloomFilter(capacity=self._revoked_filter_capacity, error_rate=self._revoked_filter_error_rate)
+
+    def _add_to_revoked_filter(self, token_jti: str) -> None:
+        """Добавляет jti в локальный фильтр отозванных токенов"""
+        self._revoked_filter.add(token_jti)
+        next_filter = self._next_revoked_filter
+        if next_filter is not None:
+            next_filter.add(token_jti)
+
+    def _schedule_revoked_filter_rebuild(self) -> None:
+        """Помечаем фильтр к пересборке, например когда могли пропустить сообщения pub/sub"""
+        self._revoked_filter_rebuild_at = 0.0
+
+    def _rebuild_revoked_filter(self) -> None:
+        """Пересобирает локальный фильтр из redis, если подошло время"""
+        with self._revoked_filter_lock:
+            if time.monotonic() < self._revoked_filter_rebuild_at or self._next_revoked_filter is not None:
+                return
+            self._next_revoked_filter = next_filter = self._new_revoked_filter()
+        try:
+            self.redis.zremrangebyscore(REVOKED_ACCESS_TOKENS_KEY, "-inf", time.time())
+            for token_jti in self.redis.zrange(REVOKED_ACCESS_TOKENS_KEY, 0, -1):
+                next_filter.add(token_jti)
+        except RedisError:
+            with self._revoked_filter_lock:
+                self._next_revoked_filter = None
+            raise
+        with self._revoked_filter_lock:
+            self._revoked_filter = next_filter
+            self._next_revoked_filter = None
+            self._revoked_filter_rebuild_at = time.monotonic() + self._revoked_filter_rebuild_interval
+
+    @redis_error_wrapper
+    def revoke_access_token(self, token_jti: str, token_exp: int) -> None:
+        """Добавляет access токен в список отозванных и оповещает об этом остальные воркеры"""
+        pipe = self._pipeline()
+        pipe.zadd(REVOKED_ACCESS_TOKENS_KEY, {token_jti: token_exp})
+        pipe.publish(REVOKED_ACCESS_TOKENS_CHANNEL, token_jti)
+        pipe.execute()
+        self._add_to_revoked_filter(token_jti)
+
+    @redis_error_wrapper
+    def is_access_token_revoked(self, token_jti: str) -> bool:
+        """Проверяет отозван ли access токен.
+        Если фильтр Блума говорит что токена точно нет, то в redis не ходим.
+        """
+        self._rebuild_revoked_filter()
+        if token_jti not in self._revoked_filter:
+            return False
+        token_exp = self.redis.zscore(REVOKED_ACCESS_TOKENS_KEY, token_jti)
+        return token_exp is not None and token_exp > time.time()
@@ -4,9 +4,19 @@
 Сервис будет зависеть от абстрактного класса, а работать будет с конкретной реализацией.
 """
 
+import typing as t
 from abc import ABC, abstractmethod
 
 
+class TokenInfo(t.NamedTuple):
+    """Выпущенный токен вместе с его jti и exp.
+    Сервис выпускающий токены и так знает эти значения, поэтому хранилищу не нужно декодировать токен заново
+    """
+    token: str
+    jti: str
+    exp: int
+
+
 class JWTStorage(ABC):
     """Абстрактный класс представляющий интерфейс для конкретных реализаций хранилищ токенов.
     Определяет методы , которые должны быть в реализации.
@@ -14,7 +24,7 @@ class JWTStorage(ABC):
     """
 
     @abstractmethod
-    def save_token(self, token: str, user_id: str) -> None:
+    def save_token(self, token: TokenInfo, user_id: str) -> None:
         """Метод для сохранения токена в хранилище. Хранить токен в разрезе user_id"""
         pass
 
@@ -28,7 +38,48 @@ class JWTStorage(ABC):
         """Метод для удаления токена из хранилища """
         pass
 
+    @abstractmethod
+    def rotate_token(self, old_jti: str, new_token: TokenInfo, user_id: str) -> bool:
+        """Метод атомарно заменяет токен `old_jti` на новый токен `new_token`.
+        Возвращает False если старого токена в хранилище уже нет, в этом случае новый токен не сохраняется
+        """
+        pass
+
     @abstractmethod
     def remove_all_user_tokens(self, user_id: str) -> None:
         """Метод для удаления всех токенов конкретного пользователя"""
         pass
+
+    @abstractmethod
+    def count_user_tokens(self, user_id: str) -> int:
+        """Метод возвращает количество действующих токенов пользователя, т.е количество активных сессий"""
+        pass
+
+    @abstractmethod
+    def get_user_tokens(self, user_id: str) -> list[str]:
+        """Метод возвращает список jti действующих токенов пользователя"""
+        pass
+
+    @abstractmethod
+    def revoke_access_token(self, token_jti: str, token_exp: int) -> None:
+        """Метод добавляет access токен в список отозванных до момента когда токен "протухнет" """
+        pass
+
+    @abstractmethod
+    def is_access_token_revoked(self, token_jti: str) -> bool:
+        """Метод проверяет отозван ли access токен. Вызывается на каждый запрос с access токеном"""
+        pass
+
+    @abstractmethod
+    def get_roles_version(self, user_id: str) -> str:
+        """Метод возвращает версию ролей пользователя. Версия меняется при любом изменении его ролей,
+        поэтому по ней можно понять, актуальны ли роли записанные в токен
+        """
+        pass
+
+    @abstractmethod
+    def bump_roles_version(self, user_id: t.Optional[str] = None) -> None:
+        """Метод меняет версию ролей пользователя, без user_id - версию ролей всех пользователей.
+        Вызывается после изменения ролей в бд
+        """
+        pass
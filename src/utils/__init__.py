@@ -1,2 +1,6 @@
 from .access_decorator import admin_required  # noqa
+from .bloom_filter import BloomFilter  # noqa
+from .db_errors import get_unique_violation  # noqa
 from .request_validation import RequestValidator  # noqa
+from .role_codec import RoleDictionary, decode_roles, encode_roles  # noqa
+from .ttl_cache import TTLCache  # noqa
@@ -0,0 +1,41 @@
+"""
+Простой фильтр Блума.
+Позволяет за несколько операций с битами ответить на вопрос "точно нет" или "возможно да".
+Используется как локальный фильтр перед обращением в redis, когда ответ "нет" встречается в подавляющем
+большинстве случаев.
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray.
+    capacity - ожидаемое количество элементов, error_rate - допустимая доля ложноположительных ответов
+    при заполнении фильтра до capacity. Удаление элементов не поддерживается, фильтр можно только пересоздать.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        """Возвращает номера битов для значения.
+        Используем двойное хеширование: из одного хеша получаем две половины h1 и h2, i-ый бит это h1 + i * h2
+        """
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value: str) -> None:
+        """Добавляет значение в фильтр"""
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        """False - значения в фильтре точно нет, True - значение возможно есть"""
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
@@ -0,0 +1,20 @@
+"""
+Разбор ошибок бд.
+"""
+
+import typing as t
+
+from sqlalchemy.exc import IntegrityError
+
+
+def get_unique_violation(error: IntegrityError, table: str, columns: t.Iterable[str]) -> t.Optional[str]:
+    """Возвращает колонку, уникальность которой нарушил запрос, или None если ошибка не про эти колонки.
+    Колонку находим в тексте ошибки:
+      - postgres: `Key (username)=(admin) already exists.`
+      - sqlite: `UNIQUE constraint failed: users.username`
+    """
+    message = str(error.orig)
+    for column in columns:
+        if f"Key ({column})=" in message or f"{table}.{column}" in message:
+            return column
+    return None
@@ -55,3 +55,21 @@ class RequestValidator:
                 return f(*args, **kwargs)
             return decorated_function
         return decorator
+
+    @classmethod
+    def validate_query_args(cls, schema):
+        """Метод возвращает декоратор для валидации параметров query string(?a=1&b=2).
+        Параметры необязательные, провалидированные данные передаются в args
+        :type schema: модель-схема описывает формат валидных входящих данных
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                try:
+                    query_args = schema().load(request.args, unknown=EXCLUDE)
+                except ValidationError as err:
+                    auth_logger.error(f"Ошибка валидации запроса {err.messages}")
+                    raise ApiValidationException(err.messages)
+                return f(*args, args=query_args, **kwargs)
+            return decorated_function
+        return decorator
@@ -0,0 +1,52 @@
+"""
+Компактная кодировка ролей пользователя в access токене.
+Вместо списка названий ролей в токен кладётся битовая маска по словарю ролей: i-ый бит маски означает
+i-ую роль словаря. Словарь это все роли в порядке создания, его версия - хеш от списка названий,
+так версия одинаково считается во всех воркерах и меняется при создании, переименовании и удалении ролей.
+
+Словарь публикуется сервисом, потребитель токена раскодирует роли функцией `decode_roles`.
+Если версия словаря в токене не совпадает с текущей, то роли по такому токену надо запросить в `/auth/authorize`.
+"""
+
+import hashlib
+import typing as t
+
+# claims компактной кодировки: маска ролей и версия словаря
+ROLES_MASK_CLAIM = "urm"
+ROLES_DICTIONARY_VERSION_CLAIM = "urv"
+
+
+class RoleDictionary(t.NamedTuple):
+    """Версионированный словарь ролей, позиция роли в словаре это номер её бита в маске"""
+
+    version: str
+    roles: tuple[str, ...]
+
+    @classmethod
+    def from_roles(cls, roles: t.Iterable[str]) -> "RoleDictionary":
+        """Строит словарь по названиям ролей в порядке их создания"""
+        roles = tuple(roles)
+        version = hashlib.blake2b("\n".join(roles).encode(), digest_size=4).hexdigest()
+        return cls(version=version, roles=roles)
+
+    def dict(self) -> dict:
+        """Приводит словарь к типу dict"""
+        return {"version": self.version, "roles": list(self.roles)}
+
+
+def encode_roles(roles: t.Iterable[str], dictionary: RoleDictionary) -> str:
+    """Кодирует роли в битовую маску, маска записывается шестнадцатеричной строкой.
+    Роли которых нет в словаре пропускаются
+    """
+    positions = {role: i for i, role in enumerate(dictionary.roles)}
+    mask = 0
+    for role in roles:
+        if role in positions:
+            mask |= 1 << positions[role]
+    return format(mask, "x")
+
+
+def decode_roles(mask: str, dictionary: RoleDictionary) -> list[str]:
+    """Раскодирует маску ролей из токена в список названий ролей"""
+    value = int(mask, 16)
+    return [role for i, role in enumerate(dictionary.roles) if value >> i & 1]
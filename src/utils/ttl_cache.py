@@ -0,0 +1,57 @@
+"""
+LRU кеш с ограничением времени жизни записей.
+Кеш живёт в памяти процесса(воркера), между воркерами записи синхронизируются инвалидацией через pub/sub.
+"""
+
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU кеш на OrderedDict. maxsize - максимальное количество записей, при переполнении вытесняется
+    давно не использованная запись. ttl - время жизни записи в секундах, 0 - кеш выключен
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[t.Hashable, tuple[float, t.Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        """Возвращает значение по ключу, для отсутствующей или просроченной записи default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: t.Hashable, value: t.Any) -> None:
+        """Сохраняет значение в кеш"""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: t.Hashable) -> None:
+        """Удаляет запись из кеша"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очищает кеш"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
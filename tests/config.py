@@ -8,6 +8,8 @@ class TestSettings(BaseSettings):
     AUTH_SERVICE_URL: str = "http://127.0.0.1:5000"
     AUTH_API_URL: str = "/api/v1"
     JWT_SECRET_KEY: str = "test_secret_key"
+    # история входов пишется только явным flush, чтобы фоновый поток не делил соединение sqlite с тестом
+    LOGIN_HISTORY_FLUSH_INTERVAL: float = 3600
 
 
 settings = TestSettings()
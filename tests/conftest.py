@@ -1,3 +1,4 @@
+import os
 import sys
 import typing as t
 from dataclasses import dataclass
@@ -9,11 +10,15 @@ import requests
 from flask import Flask
 from flask.testing import FlaskClient
 from requests.structures import CaseInsensitiveDict
+from sqlalchemy import event
 from werkzeug.test import TestResponse
 
 from .config import settings
 
 sys.path.append(str(Path(Path(__file__).parent.parent, "src")))
+# по умолчанию тесты работают с хранилищем токенов в памяти и не требуют redis,
+# для прогона тестов на redis запускаем их с переменной окружения JWT_STORAGE=redis
+os.environ.setdefault("JWT_STORAGE", "memory")
 from core import create_app, db  # noqa
 from models import Role, User  # noqa
 
@@ -59,6 +64,21 @@ def test_super_db(flask_app):
         db.session.commit()
 
 
+@pytest.fixture()
+def sql_statements(flask_app) -> list[str]:
+    """Список sql запросов к бд выполненных приложением. Перед проверяемым запросом список надо очистить"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with flask_app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture(scope="session")
 def http_client() -> requests:
     """Объект для выполнения HTTP запросов"""
@@ -0,0 +1,25 @@
+from unittest import mock
+
+from redis import Redis
+from rediscluster.pipeline import block_pipeline_command
+
+from storage import JWTRedisClusterStorage
+from storage.jwt_redis_storage import REVOKED_ACCESS_TOKENS_CHANNEL, REVOKED_ACCESS_TOKENS_KEY
+
+
+def test_cluster_logout():
+    """Проверяем logout в кластерном хранилище: pipeline кластерного клиента, как и настоящий,
+    не принимает publish, поэтому отзыв access токена должен обойтись без него
+    """
+    redis = mock.MagicMock()
+    pipeline = redis.pipeline.return_value
+    pipeline.publish = block_pipeline_command(Redis.publish)
+    storage = JWTRedisClusterStorage(redis)
+
+    storage.remove_token_by_jti(token_jti="refresh-jti", user_id="user")
+    storage.revoke_access_token(token_jti="access-jti", token_exp=2_000_000_000)
+
+    pipeline.delete.assert_called_once_with("{user}-refresh-jti")
+    redis.zadd.assert_called_once_with(REVOKED_ACCESS_TOKENS_KEY, {"access-jti": 2_000_000_000})
+    redis.publish.assert_called_once_with(REVOKED_ACCESS_TOKENS_CHANNEL, "access-jti")
+    assert "access-jti" in storage._revoked_filter
@@ -0,0 +1,38 @@
+from http import HTTPStatus
+
+import jwt
+import pytest
+from flask import Flask
+
+from core import create_app
+from utils import RoleDictionary, decode_roles
+
+from . import config
+
+
+@pytest.fixture()
+def flask_app() -> Flask:
+    """Приложение с компактной кодировкой ролей в access токене"""
+
+    class Settings(config.TestSettings):
+        JWT_COMPACT_ROLES: bool = True
+
+    return create_app(Settings())
+
+
+def test_compact_roles(test_super_db, admin_access_token, flask_client):
+    """Проверка что роли в токене передаются маской и раскодируются по опубликованному словарю"""
+    payload = jwt.decode(admin_access_token, options={"verify_signature": False})
+    headers = {"Authorization": f"Bearer {admin_access_token}"}
+    rv_anonymous = flask_client.get(f"{config.settings.AUTH_API_URL}/roles/dictionary")
+    rv = flask_client.get(f"{config.settings.AUTH_API_URL}/roles/dictionary", headers=headers)
+    dictionary = RoleDictionary(version=rv.json["version"], roles=tuple(rv.json["roles"]))
+    rv_cached = flask_client.get(
+        f"{config.settings.AUTH_API_URL}/roles/dictionary", headers={**headers, "If-None-Match": rv.headers["ETag"]}
+    )
+
+    assert rv_anonymous.status_code == HTTPStatus.UNAUTHORIZED
+    assert "ur" not in payload
+    assert payload["urv"] == dictionary.version
+    assert decode_roles(payload["urm"], dictionary) == ["Admin"]
+    assert rv_cached.status_code == HTTPStatus.NOT_MODIFIED
@@ -0,0 +1,115 @@
+import time
+import uuid
+
+import fakeredis
+import pytest
+
+from storage import JWTRedisCompactStorage
+from storage.jwt_storage import TokenInfo
+
+USER_ID = "5f0c5d3e-7a44-4b2e-9a55-1f7c1b8f2c10"
+
+
+def make_token() -> TokenInfo:
+    return TokenInfo(token="", jti=str(uuid.uuid4()), exp=int(time.time()) + 3600)
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_storage(redis_server):
+    """Хранилище поверх общего сервера redis, каждый вызов как отдельный воркер со своими клиентами"""
+    def inner() -> JWTRedisCompactStorage:
+        return JWTRedisCompactStorage(
+            redis=fakeredis.FakeRedis(server=redis_server, decode_responses=True),
+            binary_redis=fakeredis.FakeRedis(server=redis_server),
+        )
+
+    return inner
+
+
+@pytest.fixture
+def storage(make_storage):
+    return make_storage()
+
+
+def save_legacy_token(storage: JWTRedisCompactStorage, token: TokenInfo) -> None:
+    """Токен в старом формате: отдельный ключ и запись в индексе пользователя"""
+    storage.redis.set(storage._get_name(USER_ID, token.jti), token.jti, ex=token.exp - int(time.time()))
+    storage.redis.zadd(storage._get_index_name(USER_ID), {token.jti: token.exp})
+
+
+def test_save_get_remove(storage):
+    """Токен сохраняется в sorted set пользователя и удаляется из него"""
+    token = make_token()
+    storage.save_token(token, USER_ID)
+
+    assert storage.get_token_by_jti(token.jti, USER_ID) == token.jti
+    assert storage.get_user_tokens(USER_ID) == [token.jti]
+
+    storage.remove_token_by_jti(token.jti, USER_ID)
+
+    assert storage.get_token_by_jti(token.jti, USER_ID) is None
+    assert storage.count_user_tokens(USER_ID) == 0
+
+
+def test_rotate(storage):
+    """Ротация заменяет токен новым, повторная ротация того же токена не проходит"""
+    old_token, new_token = make_token(), make_token()
+    storage.save_token(old_token, USER_ID)
+
+    assert storage.rotate_token(old_token.jti, new_token, USER_ID)
+    assert not storage.rotate_token(old_token.jti, make_token(), USER_ID)
+    assert storage.get_token_by_jti(old_token.jti, USER_ID) is None
+    assert storage.get_token_by_jti(new_token.jti, USER_ID) == new_token.jti
+
+
+def test_rotate_legacy(storage):
+    """Токен в старом формате принимается при ротации и переезжает в компактный формат"""
+    old_token, new_token = make_token(), make_token()
+    save_legacy_token(storage, old_token)
+
+    assert storage.rotate_token(old_token.jti, new_token, USER_ID)
+    assert storage.redis.exists(storage._get_name(USER_ID, old_token.jti)) == 0
+    assert storage.get_token_by_jti(old_token.jti, USER_ID) is None
+    assert storage.get_user_tokens(USER_ID) == [new_token.jti]
+
+
+def test_migrate_legacy_tokens(storage):
+    """Токены переносятся в компактный формат со своим временем жизни, старые ключи и индекс удаляются"""
+    tokens = [make_token() for _ in range(3)]
+    for token in tokens:
+        save_legacy_token(storage, token)
+
+    assert storage.migrate_legacy_tokens() == 3
+    assert storage.redis.keys("*-*") == []
+    assert sorted(storage.get_user_tokens(USER_ID)) == sorted(token.jti for token in tokens)
+    score = storage.binary_redis.zscore(storage._get_compact_name(USER_ID), uuid.UUID(tokens[0].jti).bytes)
+    assert abs(score - tokens[0].exp) <= 1
+
+
+@pytest.mark.parametrize("action", ["rotate", "remove"])
+def test_migrate_concurrent_token_stays_invalid(storage, make_storage, action):
+    """Токен, который ротировали или отозвали пока шла миграция, после миграции недействителен"""
+    token, new_token = make_token(), make_token()
+    save_legacy_token(storage, token)
+    other_worker = make_storage()
+    binary_pipeline = storage.binary_redis.pipeline
+
+    def pipeline(*args, **kwargs):
+        # другой воркер обрабатывает запрос после того как миграция нашла ключ, но до переноса токена
+        storage.binary_redis.pipeline = binary_pipeline
+        if action == "rotate":
+            assert other_worker.rotate_token(token.jti, new_token, USER_ID)
+        else:
+            other_worker.remove_token_by_jti(token.jti, USER_ID)
+        return binary_pipeline(*args, **kwargs)
+
+    storage.binary_redis.pipeline = pipeline
+
+    assert storage.migrate_legacy_tokens() == 0
+    assert storage.get_token_by_jti(token.jti, USER_ID) is None
+    assert not storage.rotate_token(token.jti, make_token(), USER_ID)
@@ -0,0 +1,15 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.common import GUID
+
+
+def test_guid_dialects():
+    """Проверяем что в pg id хранится нативным uuid, в остальных бд строкой, а в python всегда строка"""
+    guid, value = GUID(), uuid.uuid4()
+
+    assert isinstance(guid.load_dialect_impl(postgresql.dialect()), postgresql.UUID)
+    assert guid.load_dialect_impl(sqlite.dialect()).length == 36
+    assert guid.process_bind_param(str(value).upper(), sqlite.dialect()) == str(value)
+    assert guid.process_result_value(value, postgresql.dialect()) == str(value)
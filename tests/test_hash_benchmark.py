@@ -0,0 +1,45 @@
+from core.password_hasher import PasswordHasher
+
+# время одного хеширования в секундах для вариантов бенчмарка: алгоритм, параметр стоимости
+TIMINGS = {
+    ("pbkdf2", 100_000): 0.04,
+    ("pbkdf2", 260_000): 0.09,
+    ("pbkdf2", 600_000): 0.2,
+    ("scrypt", 2 ** 14): 0.05,
+    ("scrypt", 2 ** 15): 0.12,
+    ("scrypt", 2 ** 16): 0.25,
+    ("argon2", 2): 0.15,
+    ("argon2", 3): 0.3,
+}
+
+
+def measure(self: PasswordHasher, min_time: float = 1.0) -> float:
+    cost = {
+        "pbkdf2": lambda: self.pbkdf2_iterations,
+        "scrypt": lambda: self.scrypt_params[0],
+        "argon2": lambda: self._argon2.time_cost,
+    }[self.method]()
+    return TIMINGS[(self.method, cost)]
+
+
+def test_hash_benchmark(flask_app, monkeypatch):
+    """Проверяем что предлагаются самые стойкие варианты каждого алгоритма, укладывающиеся в бюджет"""
+    monkeypatch.setattr(PasswordHasher, "measure", measure)
+    result = flask_app.test_cli_runner().invoke(args=["hash_benchmark", "--budget-ms", "100"])
+    suggested = result.output.split("Suggested settings for 100 ms budget:\n")[1].splitlines()
+
+    assert result.exit_code == 0
+    assert suggested == [
+        "  PASSWORD_HASH_METHOD=pbkdf2 PASSWORD_PBKDF2_ITERATIONS=260000",
+        "  PASSWORD_HASH_METHOD=scrypt PASSWORD_SCRYPT_N=16384",
+    ]
+
+
+def test_hash_benchmark_no_candidate(flask_app, monkeypatch):
+    """Проверяем сообщение, если ни один вариант не укладывается в бюджет"""
+    monkeypatch.setattr(PasswordHasher, "measure", measure)
+    result = flask_app.test_cli_runner().invoke(args=["hash_benchmark", "--budget-ms", "10"])
+
+    assert result.exit_code == 0
+    assert "PASSWORD_HASH_METHOD=" not in result.output
+    assert "no candidate fits the budget, increase --budget-ms" in result.output
@@ -0,0 +1,61 @@
+from http import HTTPStatus
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+from flask import Flask
+
+from core import create_app
+
+from . import config
+
+KEY_FACTORIES = {
+    "RS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "EdDSA": ed25519.Ed25519PrivateKey.generate,
+}
+
+
+@pytest.fixture(params=list(KEY_FACTORIES))
+def flask_app(request, tmp_path) -> Flask:
+    """Приложение с асимметричной подписью токенов: активный ключ "2" и открытый ключ "1" для проверки"""
+    for kid in ("1", "2"):
+        private_key = KEY_FACTORIES[request.param]()
+        if kid == "1":
+            public_pem = private_key.public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
+            (tmp_path / f"{kid}.pub").write_bytes(public_pem)
+        else:
+            private_pem = private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+            (tmp_path / f"{kid}.key").write_bytes(private_pem)
+
+    class Settings(config.TestSettings):
+        JWT_ALGORITHM: str = request.param
+        JWT_KEYS_DIR: str = str(tmp_path)
+        JWT_JWKS_MAX_AGE: int = 600
+
+    return create_app(Settings())
+
+
+def test_jwks(flask_client):
+    """Проверка что в jwks опубликованы все ключи и ответ кешируется"""
+    rv = flask_client.get("/.well-known/jwks.json")
+    etag = rv.headers.get("ETag")
+    rv_cached = flask_client.get("/.well-known/jwks.json", headers={"If-None-Match": etag})
+
+    assert rv.status_code == HTTPStatus.OK
+    assert sorted(key["kid"] for key in rv.json["keys"]) == ["1", "2"]
+    assert "max-age=600" in rv.headers.get("Cache-Control")
+    assert rv_cached.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_verify_token_by_jwks(test_db, flask_client, make_access_token, make_flask_request):
+    """Проверка что access токен подписан активным ключом и проверяется открытым ключом из jwks"""
+    jwks = jwt.PyJWKSet.from_dict(flask_client.get("/.well-known/jwks.json").json)
+    header = jwt.get_unverified_header(make_access_token)
+    signing_key = next(key for key in jwks.keys if key.key_id == header["kid"])
+    payload = jwt.decode(make_access_token, key=signing_key.key, algorithms=[header["alg"]])
+    rv = make_flask_request(verb="get", path="auth/secure", headers={"Authorization": f"Bearer {make_access_token}"})
+
+    assert header["kid"] == "2"
+    assert payload["type"] == "access"
+    assert rv.status_code == HTTPStatus.OK
@@ -0,0 +1,37 @@
+import datetime
+
+from core import db
+from models import LoginHistory, User, UserAgent
+from services.login_history_retention import LoginHistoryRetention, add_months
+
+
+def test_retention_months():
+    """Проверяем границу хранения: текущий месяц и retention_months полных месяцев до него"""
+    retention = LoginHistoryRetention(retention_months=2)
+
+    assert retention.get_cutoff(datetime.date(2026, 1, 20)) == datetime.date(2025, 11, 1)
+    assert add_months(datetime.date(2026, 11, 1), 3) == datetime.date(2027, 2, 1)
+
+
+def test_retention_batched_delete(flask_app, test_db):
+    """Проверяем что без секций записи старше срока хранения удаляются пачками, а свежие остаются"""
+    today = datetime.date.today()
+    old_date = datetime.datetime.combine(add_months(today.replace(day=1), -13), datetime.time.min)
+    with flask_app.app_context():
+        user = User(username="test", password="testtest")
+        db.session.add(user)
+        db.session.flush()
+        old_agent, new_agent = UserAgent(hash="old", value="old"), UserAgent(hash="new", value="new")
+        records = [dict(user_id=user.id, agent=old_agent, ip="127.0.0.1", date=old_date) for _ in range(5)]
+        records.append(dict(user_id=user.id, agent=new_agent, ip="127.0.0.1", date=datetime.datetime.now()))
+        db.session.add_all(LoginHistory(**record) for record in records)
+        db.session.commit()
+
+    flask_app.config["LOGIN_HISTORY_DELETE_BATCH_SIZE"] = 2  # 3 пачки
+    result = flask_app.test_cli_runner().invoke(args=["login_history_maintain", "--retention-months", "12"])
+
+    with flask_app.app_context():
+        agents = [log.user_agent for log in LoginHistory.query.all()]
+    assert result.exit_code == 0
+    assert "Rows deleted: 5" in result.output
+    assert agents == ["new"]
@@ -0,0 +1,60 @@
+from http import HTTPStatus
+
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from core import create_app, db
+from core.password_hasher import PasswordHasher
+from models import User
+
+from . import config
+
+HASH_PREFIXES = {"scrypt": "scrypt:", "argon2": "$argon2id$"}
+
+
+@pytest.fixture(params=["scrypt", "argon2"])
+def flask_app(request) -> Flask:
+    """Приложение с хешированием паролей через scrypt или argon2, параметры минимальные для скорости тестов"""
+
+    class Settings(config.TestSettings):
+        PASSWORD_HASH_METHOD: str = request.param
+        PASSWORD_SCRYPT_N: int = 2 ** 10
+        PASSWORD_ARGON2_TIME_COST: int = 1
+        PASSWORD_ARGON2_MEMORY_COST: int = 1024
+        PASSWORD_ARGON2_PARALLELISM: int = 1
+
+    return create_app(Settings())
+
+
+def test_rehash_on_login(flask_app, test_db, login_user):
+    """Проверка что хеш пароля от старого алгоритма пересчитывается при входе и вход продолжает работать"""
+    with flask_app.app_context():
+        db.session.add(User(username="test", password_hash=generate_password_hash("testtest")))
+        db.session.commit()
+
+    rv1 = login_user(data=dict(username="test", password="testtest"))
+    with flask_app.app_context():
+        password_hash = User.query.filter_by(username="test").first().password_hash
+    rv2 = login_user(data=dict(username="test", password="testtest"))
+    rv3 = login_user(data=dict(username="test", password="wrong_password"))
+
+    assert rv1.status_code == HTTPStatus.OK
+    assert password_hash.startswith(HASH_PREFIXES[flask_app.config["PASSWORD_HASH_METHOD"]])
+    assert rv2.status_code == HTTPStatus.OK
+    assert rv3.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_hash_threadpool():
+    """Проверка что под gevent хеширование идёт в своём пуле потоков, а пул хаба не меняется"""
+    gevent = pytest.importorskip("gevent")
+    hub_pool_size = gevent.get_hub().threadpool.maxsize
+    hasher = PasswordHasher()
+    hasher.configure("pbkdf2", pbkdf2_iterations=1_000)
+    hasher.threads, hasher._use_threadpool = 2, True
+
+    password_hash = hasher.hash("password")
+
+    assert hasher.verify(password_hash, "password")
+    assert hasher._threadpool.maxsize == 2
+    assert gevent.get_hub().threadpool.maxsize == hub_pool_size
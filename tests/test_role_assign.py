@@ -1,3 +1,10 @@
+from http import HTTPStatus
+
+from sqlalchemy import text
+
+from core import db
+
+
 def test_role_assign_unassign(test_super_db, admin_access_token, create_user, login_user, make_flask_request):
     """Тест на добавление/удаление роли пользователю"""
 
@@ -41,3 +48,39 @@ def test_role_assign_unassign(test_super_db, admin_access_token, create_user, lo
     rv = make_flask_request(verb="get", path="auth/authorize", headers={"Authorization": f"Bearer {user_access_token}"})
 
     assert name_test_role not in rv.json
+
+
+def test_authorize_from_claims(test_super_db, admin_access_token, make_flask_request, sql_statements):
+    """Тест что пока роли пользователя не менялись, авторизация отвечает по ролям из токена без запросов в бд"""
+    headers = {"Authorization": f"Bearer {admin_access_token}"}
+    sql_statements.clear()
+    rv = make_flask_request(verb="get", path="auth/authorize", headers=headers)
+
+    assert rv.json == ["Admin"]
+    assert not sql_statements
+
+
+def test_role_lookup_cached(test_super_db, admin_access_token, create_user, make_flask_request, sql_statements):
+    """Тест что роль по названию берётся из кеша ролей, без запроса в бд"""
+    user_id = create_user(data=dict(username="test", password="testtest")).json.get("id")
+    headers = {"Authorization": f"Bearer {admin_access_token}"}
+    make_flask_request(verb="post", path="roles", data={"name": "test_role"}, headers=headers)
+    make_flask_request(verb="post", path="roles/assign", data={"role_name": "test_role", "user_id": user_id},
+                       headers=headers)
+    sql_statements.clear()
+    rv = make_flask_request(verb="post", path="roles/unassign", data={"role_name": "test_role", "user_id": user_id},
+                            headers=headers)
+
+    assert rv.status_code == HTTPStatus.OK
+    assert not [statement for statement in sql_statements if "FROM roles" in statement]
+
+
+def test_user_role_indexes(flask_app, test_super_db):
+    """Проверяем что выборка пользователей роли идёт по индексу role_id, а ролей пользователя по первичному ключу"""
+    with flask_app.app_context():
+        by_role = db.session.execute(text("EXPLAIN QUERY PLAN SELECT user_id FROM user_role WHERE role_id = 'r'"))
+        by_user = db.session.execute(text("EXPLAIN QUERY PLAN SELECT role_id FROM user_role WHERE user_id = 'u'"))
+        by_role_plan, by_user_plan = str(by_role.all()), str(by_user.all())
+
+    assert "ix_user_role_role_id" in by_role_plan
+    assert "INDEX" in by_user_plan
@@ -28,6 +28,18 @@ def test_role_create(test_super_db, make_flask_request, admin_access_token):
     assert rv.json.get("name") == "superrole"
 
 
+def test_role_name_unique(test_super_db, make_flask_request, admin_access_token):
+    """Тестируем создание роли с уже занятым названием"""
+    rv = make_flask_request(
+        verb="post",
+        path="roles",
+        data=dict(name="Admin"),
+        headers={"Authorization": f"Bearer {admin_access_token}"},
+    )
+    assert rv.status_code == HTTPStatus.BAD_REQUEST
+    assert rv.json.get("description") == "Role's name already exists."
+
+
 def test_role_list(test_super_db, make_flask_request, admin_access_token):
     """Тест вывода списка ролей.
     Создаём несколько ролей потом проверяем список, доступно только Admin
@@ -92,3 +104,17 @@ def test_role_delete(test_super_db, make_flask_request, admin_access_token):
 
     assert "superrole1" in rv1.data.decode()
     assert "superrole1" not in rv2.data.decode()
+
+
+def test_redis_pools_access(test_super_db, flask_client, login_user, create_user, admin_access_token):
+    """Тестируем доступ к статистике пулов redis только для admin"""
+    create_user(data=dict(username="pools_user", password="pools_user"))
+    user_access_token = login_user(data=dict(username="pools_user", password="pools_user")).json.get("access_token")
+
+    rv1 = flask_client.get("/redis_pools")
+    rv2 = flask_client.get("/redis_pools", headers={"Authorization": f"Bearer {user_access_token}"})
+    rv3 = flask_client.get("/redis_pools", headers={"Authorization": f"Bearer {admin_access_token}"})
+
+    assert rv1.status_code == HTTPStatus.UNAUTHORIZED
+    assert rv2.status_code == HTTPStatus.FORBIDDEN
+    assert rv3.status_code == HTTPStatus.OK
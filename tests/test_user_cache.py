@@ -0,0 +1,32 @@
+from http import HTTPStatus
+
+
+def test_current_user_cached(test_super_db, admin_access_token, make_flask_request, sql_statements):
+    """Проверка что при повторных запросах пользователь берётся из кеша, без запросов в бд"""
+    headers = {"Authorization": f"Bearer {admin_access_token}"}
+    make_flask_request(verb="get", path="auth/me", headers=headers)
+    sql_statements.clear()
+    rv = make_flask_request(verb="get", path="auth/me", headers=headers)
+
+    assert rv.status_code == HTTPStatus.OK
+    assert rv.json.get("username") == "admin"
+    assert not [statement for statement in sql_statements if "FROM users" in statement]
+
+
+def test_user_cache_invalidated_on_assign(
+    test_super_db, admin_access_token, create_user, login_user, make_flask_request
+):
+    """Проверка что после назначения роли закешированный пользователь обновляется"""
+    user_id = create_user(data=dict(username="test", password="testtest")).json.get("id")
+    access_token = login_user(data=dict(username="test", password="testtest")).json.get("access_token")
+    rv1 = make_flask_request(verb="get", path="roles", headers={"Authorization": f"Bearer {access_token}"})
+    make_flask_request(
+        verb="post",
+        path="roles/assign",
+        data={"role_name": "Admin", "user_id": user_id},
+        headers={"Authorization": f"Bearer {admin_access_token}"},
+    )
+    rv2 = make_flask_request(verb="get", path="roles", headers={"Authorization": f"Bearer {access_token}"})
+
+    assert rv1.status_code == HTTPStatus.FORBIDDEN
+    assert rv2.status_code == HTTPStatus.OK
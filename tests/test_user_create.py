@@ -57,3 +57,12 @@ def test_email_unique(test_db, create_user):
 
     assert rv.status_code == HTTPStatus.BAD_REQUEST
     assert rv.json.get("description") == "Email is already registered."
+
+
+def test_registration_queries(test_db, create_user, sql_statements):
+    """Тест что при регистрации уникальность username и email заранее не проверяется запросами в бд"""
+    sql_statements.clear()
+    rv = create_user(data=VALID_USER)
+
+    assert rv.status_code == HTTPStatus.OK
+    assert sql_statements[0].lstrip().startswith("INSERT INTO users")
@@ -1,5 +1,7 @@
 from http import HTTPStatus
 
+from services import JWTService
+
 from .validation.schema import JWTResponseSchema
 from .validation.validator import Validator
 
@@ -31,3 +33,35 @@ def test_success_login(test_db, create_user, login_user):
 
     assert rv.status_code == HTTPStatus.OK
     assert Validator.validate_response(rv, JWTResponseSchema)
+
+
+def test_login_queries(test_super_db, login_user, sql_statements):
+    """Проверка запросов при входе: пользователь без ролей, затем, после чтения версии ролей, только названия ролей"""
+    sql_statements.clear()
+    rv = login_user(data=dict(username="admin", password="adminadmin"))
+    selects = [statement for statement in sql_statements if statement.lstrip().startswith("SELECT")]
+
+    assert rv.status_code == HTTPStatus.OK
+    assert len(selects) == 2
+    assert "roles" not in selects[0]
+    assert selects[1].lstrip().startswith("SELECT roles.name")
+
+
+def test_login_roles_after_version(test_super_db, login_user, sql_statements, monkeypatch):
+    """Проверка что роли для токена загружаются после чтения их версии,
+    иначе изменение ролей между загрузкой и чтением версии дало бы токен с устаревшими ролями и новой версией
+    """
+    version_read_at = []
+    get_roles_version = JWTService.get_roles_version
+
+    def tracked_get_roles_version(self, user_id):
+        version_read_at.append(len(sql_statements))
+        return get_roles_version(self, user_id)
+
+    monkeypatch.setattr(JWTService, "get_roles_version", tracked_get_roles_version)
+    sql_statements.clear()
+    rv = login_user(data=dict(username="admin", password="adminadmin"))
+    roles_selects = [i for i, statement in enumerate(sql_statements) if "roles" in statement]
+
+    assert rv.status_code == HTTPStatus.OK
+    assert roles_selects and min(roles_selects) >= version_read_at[0]
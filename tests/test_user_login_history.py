@@ -1,5 +1,12 @@
+import datetime
+import json
 from http import HTTPStatus
 
+from core import db
+from models import LoginHistory, User, UserAgent
+from services.login_history_writer import login_history_writer
+from services.user_agent_cache import user_agent_cache
+
 
 def test_login_history(test_db, create_user, login_user, make_flask_request):
     """
@@ -16,3 +23,158 @@ def test_login_history(test_db, create_user, login_user, make_flask_request):
     assert rv.status_code == HTTPStatus.OK
     assert '"user_agent":"Test Mozilla"' in rv.data.decode()
     assert '"user_agent":"Test Chrome"' in rv.data.decode()
+
+
+def test_login_history_buffered(test_db, create_user, login_user, make_flask_request, sql_statements):
+    """
+    Проверяем что вход не пишет историю в бд, запись пишется пачкой при запросе истории
+    """
+    create_user(data=dict(username="test", password="testtest"))
+    sql_statements.clear()
+    res = login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": "Test Chrome"})
+    login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": "Test Mozilla"})
+    assert not [statement for statement in sql_statements if "login_history" in statement]
+
+    rv = make_flask_request(
+        verb="get", path="auth/login_history", headers={"Authorization": f"Bearer {res.json.get('access_token')}"}
+    )
+    inserts = [statement for statement in sql_statements if statement.lstrip().startswith("INSERT INTO login_history")]
+
+    assert rv.status_code == HTTPStatus.OK
+    assert len(rv.json) == 2
+    assert len(inserts) == 1
+
+
+def test_login_history_pages(test_db, create_user, login_user, make_flask_request):
+    """
+    Проверяем постраничную выдачу истории: записи от новых к старым,
+    курсор следующей страницы в заголовке X-Next-Cursor, на последней странице заголовка нет
+    """
+    create_user(data=dict(username="test", password="testtest"))
+    for agent in ("Agent 1", "Agent 2", "Agent 3"):
+        res = login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": agent})
+    headers = {"Authorization": f"Bearer {res.json.get('access_token')}"}
+
+    first = make_flask_request(verb="get", path="auth/login_history?limit=2", headers=headers)
+    cursor = first.headers.get("X-Next-Cursor")
+    last = make_flask_request(verb="get", path=f"auth/login_history?limit=2&after={cursor}", headers=headers)
+
+    assert first.status_code == HTTPStatus.OK
+    assert [log["user_agent"] for log in first.json] == ["Agent 3", "Agent 2"]
+    assert cursor
+    assert [log["user_agent"] for log in last.json] == ["Agent 1"]
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_login_history_bad_args(test_db, create_user, login_user, make_flask_request):
+    """Проверяем что некорректный курсор и размер страницы отклоняются"""
+    create_user(data=dict(username="test", password="testtest"))
+    res = login_user(data=dict(username="test", password="testtest"))
+    headers = {"Authorization": f"Bearer {res.json.get('access_token')}"}
+
+    rv_cursor = make_flask_request(verb="get", path="auth/login_history?after=yesterday", headers=headers)
+    rv_limit = make_flask_request(verb="get", path="auth/login_history?limit=0", headers=headers)
+
+    assert rv_cursor.status_code == HTTPStatus.BAD_REQUEST
+    assert rv_limit.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_login_history_export(test_db, create_user, login_user, make_flask_request):
+    """
+    Проверяем выгрузку истории потоком в NDJSON и CSV: по строке на вход, от новых к старым
+    """
+    create_user(data=dict(username="test", password="testtest"))
+    for agent in ("Test Chrome", "Test Mozilla"):
+        res = login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": agent})
+    headers = {"Authorization": f"Bearer {res.json.get('access_token')}"}
+
+    rv_ndjson = make_flask_request(verb="get", path="auth/login_history/export", headers=headers)
+    rv_csv = make_flask_request(verb="get", path="auth/login_history/export?format=csv", headers=headers)
+    ndjson_lines = rv_ndjson.data.decode().splitlines()
+    csv_lines = rv_csv.data.decode().splitlines()
+
+    assert rv_ndjson.status_code == HTTPStatus.OK
+    assert rv_ndjson.mimetype == "application/x-ndjson"
+    ndjson_rows = [json.loads(line) for line in ndjson_lines]
+    csv_rows = [line.split(",") for line in csv_lines[1:]]
+
+    assert [row["user_agent"] for row in ndjson_rows] == ["Test Mozilla", "Test Chrome"]
+    assert rv_csv.mimetype == "text/csv"
+    assert csv_lines[0] == "user_id,user_agent,ip,date"
+    assert [row[1] for row in csv_rows] == ["Test Mozilla", "Test Chrome"]
+    # дата в обоих форматах в ISO 8601 и одинаковая
+    assert [row["date"] for row in ndjson_rows] == [row[3] for row in csv_rows]
+    assert all(datetime.datetime.fromisoformat(row["date"]) for row in ndjson_rows)
+
+
+def test_login_history_user_agents(flask_app, test_db, create_user, login_user, make_flask_request, sql_statements):
+    """
+    Проверяем что одинаковые User-Agent хранятся в справочнике один раз,
+    а известные id берутся из кеша без запроса к справочнику
+    """
+    create_user(data=dict(username="test", password="testtest"))
+    res = login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": "Test Chrome"})
+    headers = {"Authorization": f"Bearer {res.json.get('access_token')}"}
+    make_flask_request(verb="get", path="auth/login_history", headers=headers)
+    login_user(data=dict(username="test", password="testtest"), headers={"User-Agent": "Test Chrome"})
+    sql_statements.clear()
+    rv = make_flask_request(verb="get", path="auth/login_history", headers=headers)
+    lookups = [statement for statement in sql_statements if "user_agents" in statement and "JOIN" not in statement]
+
+    with flask_app.app_context():
+        user_agents = UserAgent.query.all()
+    assert [log["user_agent"] for log in rv.json] == ["Test Chrome", "Test Chrome"]
+    assert [user_agent.value for user_agent in user_agents] == ["Test Chrome"]
+    assert not lookups
+
+
+def test_login_history_flush_keeps_request_session(flask_app, test_db):
+    """Проверяем что запись буфера в запросе не коммитит и не сбрасывает сессию запроса"""
+    with flask_app.test_request_context():
+        user = User(username="test", password="testtest")
+        db.session.add(user)
+        db.session.flush()
+        pending = User(username="pending", password="testtest")
+        db.session.add(pending)
+        login_history_writer.add(
+            user_id=user.id, user_agent="Test Chrome", ip="127.0.0.1", date=datetime.datetime.now()
+        )
+        login_history_writer.flush()
+
+        assert pending in db.session.new
+        db.session.rollback()
+        assert User.query.filter_by(username="pending").first() is None
+
+
+def test_login_history_bad_record_dropped(flask_app, test_db):
+    """Проверяем что запись, которую бд не принимает, отбрасывается, а остальные записи пачки пишутся"""
+    with flask_app.app_context():
+        user = User(username="test", password="testtest")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    for ip in ("127.0.0.1", None, "127.0.0.2"):
+        login_history_writer.add(user_id=user_id, user_agent="Test Chrome", ip=ip, date=datetime.datetime.now())
+    login_history_writer.flush()
+
+    with flask_app.app_context():
+        ips = sorted(log.ip for log in LoginHistory.query.all())
+    assert ips == ["127.0.0.1", "127.0.0.2"]
+    assert not login_history_writer._buffer
+
+
+def test_login_history_add_never_raises(flask_app, test_db, monkeypatch):
+    """Проверяем что ошибка подготовки записей не ломает вход: записи возвращаются в буфер,
+    а после LOGIN_HISTORY_MAX_ATTEMPTS попыток отбрасываются
+    """
+    def get_ids(engine, values):
+        raise RuntimeError("user agent lookup failed")
+
+    monkeypatch.setattr(user_agent_cache, "get_ids", get_ids)
+    monkeypatch.setattr(login_history_writer, "buffer_size", 1)
+    login_history_writer.add(user_id="user", user_agent="Test Chrome", ip="127.0.0.1", date=datetime.datetime.now())
+
+    assert len(login_history_writer._buffer) == 1
+    for _ in range(login_history_writer.max_attempts - 1):
+        login_history_writer.flush()
+    assert not login_history_writer._buffer
@@ -18,3 +18,31 @@ def test_success_logout(test_db, make_refresh_token, make_refresh_request, logou
     rv = make_refresh_request(refresh_token)
 
     assert rv.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_success_logout_all(test_db, create_user, login_user, make_flask_request, make_refresh_request):
+    """Проверка выхода "со всех устройств".
+    Делаем два входа под одним пользователем, выходим со всех устройств используя access токен второго входа.
+    После этого ни по одному из refresh токенов нельзя получить новую пару токенов
+    """
+    create_user(data=dict(username="test", password="testtest"))
+    res1 = login_user(data=dict(username="test", password="testtest"))
+    res2 = login_user(data=dict(username="test", password="testtest"))
+    access_token = res2.json.get("access_token")
+    make_flask_request(verb="get", path="auth/logout_all", headers={"Authorization": f"Bearer {access_token}"})
+    rv1 = make_refresh_request(res1.json.get("refresh_token"))
+    rv2 = make_refresh_request(res2.json.get("refresh_token"))
+
+    assert rv1.status_code == HTTPStatus.UNAUTHORIZED
+    assert rv2.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_access_token_revoked_after_logout(test_db, make_access_token, make_flask_request, logout_user):
+    """Проверка что после выхода access токен, с которым был выполнен выход, больше не принимается"""
+    headers = {"Authorization": f"Bearer {make_access_token}"}
+    rv1 = make_flask_request(verb="get", path="auth/secure", headers=headers)
+    logout_user(headers=headers)
+    rv2 = make_flask_request(verb="get", path="auth/secure", headers=headers)
+
+    assert rv1.status_code == HTTPStatus.OK
+    assert rv2.status_code == HTTPStatus.UNAUTHORIZED
@@ -11,3 +11,12 @@ def test_user_get_profile(test_db, create_user, login_user, make_flask_request):
     assert rv.status_code == HTTPStatus.OK
     assert rv.json.get("email") == "test@test.ru"
     assert rv.json.get("username") == "test"
+
+
+def test_admin_check_without_user_query(test_super_db, admin_access_token, make_flask_request, sql_statements):
+    """Проверка что для проверки роли admin пользователь из бд не загружается, роли берутся из токена"""
+    sql_statements.clear()
+    rv = make_flask_request(verb="get", path="roles", headers={"Authorization": f"Bearer {admin_access_token}"})
+
+    assert rv.status_code == HTTPStatus.OK
+    assert not [statement for statement in sql_statements if "FROM users" in statement]